@@ -1,10 +1,61 @@
-from .jira_tools import get_user_jira_credentials
-from .llm_handler import call_llm, collect_tools, get_available_models, handle_llm_command
+import importlib
+import time
+from typing import Dict
+
+_EXPORTS = {
+    'apply_change_set': '.jira_changes',
+    'build_change_set': '.jira_changes',
+    'call_llm': '.llm_handler',
+    'collect_tools': '.llm_handler',
+    'fetch_project_issues': '.llm_handler',
+    'get_available_models': '.llm_handler',
+    'get_cache_stats': '.jira_cache',
+    'get_routing_stats': '.model_router',
+    'get_usage_stats': '.token_budget',
+    'get_user_jira_credentials': '.jira_tools',
+    'handle_llm_command': '.llm_handler',
+}
+
+WARM_UP_MODULES = [
+    'langchain_openai',
+    'langchain_core.messages',
+    'LLM.token_budget',
+    'LLM.jira_cache',
+    'LLM.jira_tools',
+    'LLM.model_router',
+    'LLM.agent_runner',
+    'LLM.llm_handler',
+    'LLM.jira_changes',
+]
 
 __all__ = [
+    'apply_change_set',
+    'build_change_set',
     'call_llm',
     'collect_tools',
+    'fetch_project_issues',
     'get_available_models',
+    'get_cache_stats',
+    'get_routing_stats',
+    'get_usage_stats',
     'get_user_jira_credentials',
     'handle_llm_command',
+    'warm_up',
 ]
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def warm_up() -> Dict[str, float]:
+    timings = {}
+    for module in WARM_UP_MODULES:
+        started_at = time.perf_counter()
+        importlib.import_module(module)
+        timings[module] = time.perf_counter() - started_at
+    return timings
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from langchain.tools import StructuredTool
+from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
+from langchain_openai import ChatOpenAI
+
+from .token_budget import RequestUsage, TokenBudgetExceeded, count_message_tokens, count_tokens, truncate_text
+from .trace_recorder import record_llm_call, record_tool_call
+
+logger = logging.getLogger(__name__)
+
+AGENT_MAX_TURNS = int(os.environ.get("AGENT_MAX_TURNS", "5"))
+BRIEF_DEADLINE_SECONDS = float(os.environ.get("BRIEF_DEADLINE_SECONDS", "90"))
+FINAL_ANSWER_PROMPT = "Tool budget is exhausted. Respond now with the final answer in the required format."
+DROPPED_TOOL_OUTPUT = "[tool output dropped: token budget spent]"
+FINAL_ANSWER_RESERVE = 100
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+def remaining_time(deadline: float) -> float:
+    if (remaining := deadline - asyncio.get_running_loop().time()) <= 0:
+        raise DeadlineExceeded(f"Brief deadline of {BRIEF_DEADLINE_SECONDS:.0f}s exceeded")
+    return remaining
+
+
+async def run_tool_call(tools_by_name: Dict[str, StructuredTool], tool_call: Dict) -> str:
+    if not (tool := tools_by_name.get(tool_call['name'])):
+        return f"Unknown tool: {tool_call['name']}"
+    started_at = time.monotonic()
+    try:
+        result = str(await tool.ainvoke(tool_call['args']))
+    except Exception as e:
+        logger.warning(f"Tool {tool_call['name']} failed: {e}")
+        result = f"Error running {tool_call['name']}: {e}"
+    record_tool_call(tool_call['name'], tool_call['args'], result, time.monotonic() - started_at)
+    return result
+
+
+def shrink_tool_outputs(messages: List[BaseMessage], usage: RequestUsage) -> None:
+    excess = count_message_tokens(messages) - usage.remaining_input_tokens
+    for i, message in enumerate(messages):
+        if excess <= 0:
+            return
+        if not isinstance(message, ToolMessage):
+            continue
+        tokens = count_tokens(str(message.content))
+        content = truncate_text(message.content, tokens - excess) if tokens > excess else DROPPED_TOOL_OUTPUT
+        messages[i] = ToolMessage(content=content, tool_call_id=message.tool_call_id)
+        excess -= tokens - count_tokens(content)
+
+
+async def invoke_model(llm, messages: List[BaseMessage], model_name: str, usage: RequestUsage, deadline: float):
+    if not usage.fits(messages):
+        raise TokenBudgetExceeded(f"Brief input budget of {usage.max_input_tokens} tokens exceeded")
+    started_at = time.monotonic()
+    response = await asyncio.wait_for(llm.ainvoke(messages), remaining_time(deadline))
+    record_llm_call(model_name, response, time.monotonic() - started_at)
+    usage.record(messages, response)
+    return response
+
+
+async def run_agent(llm: ChatOpenAI, tools: List[StructuredTool], messages: List[BaseMessage],
+                    max_turns: int = AGENT_MAX_TURNS, deadline_seconds: float = BRIEF_DEADLINE_SECONDS,
+                    usage: Optional[RequestUsage] = None) -> str:
+    deadline = asyncio.get_running_loop().time() + deadline_seconds
+    usage = usage or RequestUsage()
+    tools_by_name = {tool.name: tool for tool in tools}
+    llm_with_tools = llm.bind_tools(tools, parallel_tool_calls=True)
+    messages = list(messages)
+
+    for turn in range(1, max_turns + 1):
+        if usage.remaining_input_tokens < 2 * count_message_tokens(messages):
+            logger.warning(f"Token budget leaves no room for another tool turn after {turn - 1} turn(s), "
+                           f"requesting final answer without tools")
+            break
+        response = await invoke_model(llm_with_tools, messages, llm.model_name, usage, deadline)
+        messages.append(response)
+        if not response.tool_calls:
+            logger.info(f"Agent finished after {turn} model turn(s), {usage.input_tokens} input tokens used")
+            return response.content
+
+        logger.info(f"Turn {turn}: running {len(response.tool_calls)} tool call(s) concurrently: "
+                    f"{', '.join(call['name'] for call in response.tool_calls)}")
+        results = await asyncio.wait_for(
+            asyncio.gather(*(run_tool_call(tools_by_name, call) for call in response.tool_calls)),
+            remaining_time(deadline)
+        )
+        result_budget = max(usage.remaining_input_tokens - count_message_tokens(messages) - FINAL_ANSWER_RESERVE, 0)
+        result_budget //= len(results)
+        messages.extend(
+            ToolMessage(content=truncate_text(result, result_budget), tool_call_id=call['id'])
+            for call, result in zip(response.tool_calls, results)
+        )
+    else:
+        logger.warning(f"Agent used all {max_turns} turns, requesting final answer without tools")
+
+    messages.append(HumanMessage(content=FINAL_ANSWER_PROMPT))
+    shrink_tool_outputs(messages, usage)
+    response = await invoke_model(llm, messages, llm.model_name, usage, deadline)
+    return response.content
@@ -0,0 +1,152 @@
+import logging
+import math
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+ISSUE_KEY_PATTERN = re.compile(r'\b[A-Za-z][A-Za-z0-9]+-\d+\b')
+TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+SENDER_PATTERN = re.compile(r'^\W*([^:\n]{1,64}?)\W*:\s+(.*)$')
+MIN_TERM_LENGTH = 3
+STEM_LENGTH = 6
+KEY_MATCH_SCORE = 10.0
+SENDER_MATCH_SCORE = 0.5
+MIN_LINE_SCORE = 2.5
+MIN_MATCHED_TERMS = 2
+MAX_TERM_SHARE = 0.25
+MIN_ISSUES_FOR_TERM_SHARE = 8
+CONTEXT_WINDOW = 1
+MAX_LINES_PER_ISSUE = 15
+
+STOP_WORDS = {
+    'the', 'and', 'for', 'with', 'this', 'that', 'from', 'are', 'was', 'will', 'have', 'has', 'not',
+    'but', 'all', 'can', 'should', 'need', 'task', 'issue', 'bug', 'story',
+    'это', 'что', 'как', 'для', 'или', 'так', 'уже', 'все', 'его', 'она', 'они', 'надо', 'нужно',
+    'задача', 'задачу', 'задачи',
+}
+
+
+def extract_terms(text: str) -> List[str]:
+    terms = []
+    for token in TERM_PATTERN.findall(text.lower()):
+        if len(token) < MIN_TERM_LENGTH or token in STOP_WORDS or token.isdigit():
+            continue
+        terms.append(token[:STEM_LENGTH])
+    return terms
+
+
+def split_sender(line: str) -> Tuple[str, str]:
+    if match := SENDER_PATTERN.match(line):
+        return match.group(1), match.group(2)
+    return "", line
+
+
+def extract_issue_keys(text: str) -> Set[str]:
+    return {key.upper() for key in ISSUE_KEY_PATTERN.findall(text)}
+
+
+class IssueIndex:
+
+    def __init__(self, issues: Iterable[Dict]):
+        self.issues: Dict[str, Dict] = {}
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        self._people: Dict[str, Set[str]] = {}
+
+        for issue in issues:
+            if not (key := issue.get('key')):
+                continue
+            self.issues[key] = issue
+            for term in self._issue_terms(issue):
+                self._postings[term].add(key)
+            self._people[key] = self._people_terms(issue)
+
+        total = max(len(self.issues), 1)
+        if total >= MIN_ISSUES_FOR_TERM_SHARE:
+            common = [term for term, keys in self._postings.items() if len(keys) / total > MAX_TERM_SHARE]
+            for term in common:
+                del self._postings[term]
+        self._idf = {term: math.log(1 + total / len(keys)) for term, keys in self._postings.items()}
+        logger.info(f"Built issue index: {len(self.issues)} issues, {len(self._postings)} terms")
+
+    @classmethod
+    def from_search_result(cls, result: Dict) -> "IssueIndex":
+        return cls(result.get('issues', []) or [])
+
+    @staticmethod
+    def _issue_terms(issue: Dict) -> Set[str]:
+        fields = issue.get('fields', {}) or {}
+        terms = set(extract_terms(fields.get('summary') or ''))
+        terms.update(extract_terms(issue['key'].split('-')[0]))
+        return terms
+
+    @staticmethod
+    def _people_terms(issue: Dict) -> Set[str]:
+        fields = issue.get('fields', {}) or {}
+        names = [(fields.get(person) or {}).get('displayName') or '' for person in ('assignee', 'reporter')]
+        return set(extract_terms(' '.join(names)))
+
+    def score_line(self, line: str) -> Dict[str, float]:
+        sender, body = split_sender(line)
+        scores: Dict[str, float] = defaultdict(float)
+        matched_terms: Dict[str, int] = defaultdict(int)
+        for key in extract_issue_keys(body):
+            if key in self.issues:
+                scores[key] += KEY_MATCH_SCORE
+        for term in set(extract_terms(body)):
+            for key in self._postings.get(term, ()):
+                scores[key] += self._idf[term]
+                matched_terms[key] += 1
+
+        sender_terms = set(extract_terms(sender))
+        for key in scores:
+            if sender_terms & self._people.get(key, set()):
+                scores[key] += SENDER_MATCH_SCORE
+        return {
+            key: score for key, score in scores.items()
+            if score >= KEY_MATCH_SCORE or (matched_terms[key] >= MIN_MATCHED_TERMS and score >= MIN_LINE_SCORE)
+        }
+
+    def _select_indexes(self, lines: List[str]) -> Dict[str, Set[int]]:
+        selected: Dict[str, Set[int]] = defaultdict(set)
+        for i, line in enumerate(lines):
+            for key in self.score_line(line):
+                selected[key].update(range(max(i - CONTEXT_WINDOW, 0), min(i + CONTEXT_WINDOW + 1, len(lines))))
+        return selected
+
+    def select_lines(self, transcript: str) -> Dict[str, List[str]]:
+        lines = [line for line in transcript.splitlines() if line.strip()]
+        return {
+            key: [lines[i] for i in sorted(indexes)[-MAX_LINES_PER_ISSUE:]]
+            for key, indexes in self._select_indexes(lines).items()
+        }
+
+    def format_issue(self, key: str) -> str:
+        fields = self.issues[key].get('fields', {}) or {}
+        status = (fields.get('status') or {}).get('name', 'Unknown')
+        assignee = (fields.get('assignee') or {}).get('displayName', 'Unassigned')
+        return f"{key} [{status}] {fields.get('summary', '')} (assignee: {assignee})"
+
+    def build_context(self, transcript: str, keys: Optional[Iterable[str]] = None) -> str:
+        keys = set(keys) if keys is not None else None
+        lines = [line for line in transcript.splitlines() if line.strip()]
+        selected = self._select_indexes(lines)
+        matched = set().union(*selected.values())
+        bundles = {
+            key: [lines[i] for i in sorted(indexes)[-MAX_LINES_PER_ISSUE:]]
+            for key, indexes in selected.items() if keys is None or key in keys
+        }
+        if not bundles:
+            return ""
+
+        sections = []
+        for key, lines_for_issue in bundles.items():
+            sections.append(f"Issue {self.format_issue(key)}\nRelevant chat lines:\n" + "\n".join(lines_for_issue))
+        if unmatched := [line for i, line in enumerate(lines) if i not in matched]:
+            sections.append("Chat lines not related to a known issue:\n" + "\n".join(unmatched))
+
+        logger.info(
+            f"Matched chat lines to {len(bundles)} of {len(self.issues)} issues, {len(unmatched)} lines unmatched"
+        )
+        return "\n\n".join(sections)
@@ -0,0 +1,123 @@
+import copy
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+JIRA_CACHE_TTL_SECONDS = float(os.environ.get("JIRA_CACHE_TTL_SECONDS", "60"))
+JIRA_CACHE_MAX_ENTRIES = int(os.environ.get("JIRA_CACHE_MAX_ENTRIES", "512"))
+JQL_WHITESPACE_PATTERN = re.compile(r'("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')|\s+')
+
+
+def normalize_jql(jql: str) -> str:
+    return JQL_WHITESPACE_PATTERN.sub(lambda match: match.group(1) or " ", jql.strip())
+
+
+def normalize_fields(fields: Optional[List[str]]) -> Optional[Tuple[str, ...]]:
+    return tuple(sorted(set(fields))) if fields else None
+
+
+def build_cache_key(cloud_id: str, scope: str, endpoint: str, params: Dict) -> Tuple:
+    return cloud_id, scope, endpoint, json.dumps(params, sort_keys=True, default=list)
+
+
+class ResponseCache:
+
+    def __init__(self, ttl_seconds: float = JIRA_CACHE_TTL_SECONDS, max_entries: int = JIRA_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.expired = 0
+        self.evicted = 0
+        self.invalidated = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get_or_fetch(self, key: Tuple, fetch: Callable[[], Any]) -> Any:
+        if not self.enabled:
+            return fetch()
+
+        with self._lock:
+            if entry := self._entries.get(key):
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+                self.expired += 1
+
+            if future := self._in_flight.get(key):
+                self.coalesced += 1
+                owner = False
+            else:
+                future = self._in_flight[key] = Future()
+                self.misses += 1
+                owner = True
+
+        if not owner:
+            logger.debug(f"Waiting for in-flight Jira request {key[2]}")
+            return copy.deepcopy(future.result())
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._in_flight[key]
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+        future.set_result(value)
+        return copy.deepcopy(value)
+
+    def invalidate(self, cloud_id: str) -> None:
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == cloud_id]
+            for key in stale:
+                del self._entries[key]
+            self.invalidated += len(stale)
+        if stale:
+            logger.info(f"Invalidated {len(stale)} cached Jira responses for cloud {cloud_id}")
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "in_flight": len(self._in_flight),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "invalidated": self.invalidated,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            }
+
+
+response_cache = ResponseCache()
+
+
+def get_cache_stats() -> Dict:
+    return response_cache.as_dict()
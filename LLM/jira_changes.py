@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from .jira_tools import JiraClient
+
+logger = logging.getLogger(__name__)
+
+JIRA_APPLY_CONCURRENCY = int(os.environ.get("JIRA_APPLY_CONCURRENCY", "5"))
+JIRA_APPLY_RATE = float(os.environ.get("JIRA_APPLY_RATE", "10"))
+JIRA_BULK_POLL_INTERVAL = float(os.environ.get("JIRA_BULK_POLL_INTERVAL", "1"))
+JIRA_BULK_POLL_TIMEOUT = float(os.environ.get("JIRA_BULK_POLL_TIMEOUT", "60"))
+BULK_TASK_FINAL_STATUSES = {'COMPLETE', 'FAILED', 'CANCELLED', 'DEAD'}
+
+
+class RateLimiter:
+
+    def __init__(self, max_concurrency: int = JIRA_APPLY_CONCURRENCY, rate_per_second: float = JIRA_APPLY_RATE):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._interval = 1 / rate_per_second if rate_per_second > 0 else 0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def run(self, func: Callable, *args):
+        async with self._semaphore:
+            async with self._lock:
+                now = time.monotonic()
+                delay = self._next_start - now
+                self._next_start = max(now, self._next_start) + self._interval
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return await asyncio.to_thread(func, *args)
+
+
+def build_change_set(agreements: List[Dict]) -> List[Dict]:
+    changes = []
+    for agreement in agreements:
+        if not agreement.get('issue_key') or not (agreement.get('new_status') or agreement.get('comment')):
+            continue
+        changes.append({
+            'issue_key': agreement['issue_key'],
+            'new_status': agreement.get('new_status'),
+            'comment': agreement.get('comment')
+        })
+    return changes
+
+
+def find_transition_id(transitions: List[Dict], status: str) -> Optional[str]:
+    status = status.strip().lower()
+    for transition in transitions:
+        if (transition.get('to') or {}).get('name', '').lower() == status or transition.get('name', '').lower() == status:
+            return transition['id']
+    return None
+
+
+async def apply_transitions(client: JiraClient, limiter: RateLimiter, changes: List[Dict], result: Dict) -> None:
+    changes = [change for change in changes if change.get('new_status')]
+    if not changes:
+        return
+
+    transitions_list = await asyncio.gather(
+        *(limiter.run(client.get_transitions, change['issue_key']) for change in changes),
+        return_exceptions=True
+    )
+
+    groups: Dict[str, List[str]] = defaultdict(list)
+    for change, transitions in zip(changes, transitions_list):
+        if isinstance(transitions, Exception):
+            result['failed'].append({'issue_key': change['issue_key'], 'error': str(transitions)})
+        elif transition_id := find_transition_id(transitions, change['new_status']):
+            groups[transition_id].append(change['issue_key'])
+        else:
+            result['failed'].append({
+                'issue_key': change['issue_key'],
+                'error': f"No transition to status '{change['new_status']}'"
+            })
+
+    if not groups:
+        return
+
+    try:
+        response = await limiter.run(client.bulk_transition_issues, dict(groups))
+        if not (task_id := response.get('taskId')):
+            raise ValueError(f"Bulk transition returned no taskId: {response}")
+    except Exception as e:
+        logger.warning(f"Bulk transition failed, falling back to per-issue transitions: {e}")
+        await transition_individually(client, limiter, groups, result)
+        return
+
+    issue_keys = [issue_key for keys in groups.values() for issue_key in keys]
+    try:
+        task = await wait_for_bulk_task(client, limiter, task_id)
+        collect_bulk_outcome(issue_keys, task, await get_issue_ids(client, limiter, issue_keys), result)
+    except Exception as e:
+        logger.error(f"Could not get the outcome of bulk transition {task_id}: {e}")
+        result['failed'].extend(
+            {'issue_key': issue_key, 'error': f"Outcome of bulk transition {task_id} unknown: {e}"}
+            for issue_key in issue_keys
+        )
+
+
+async def wait_for_bulk_task(client: JiraClient, limiter: RateLimiter, task_id: str) -> Dict:
+    deadline = time.monotonic() + JIRA_BULK_POLL_TIMEOUT
+    while True:
+        task = await limiter.run(client.get_bulk_task, task_id)
+        if task.get('status') in BULK_TASK_FINAL_STATUSES:
+            logger.info(f"Bulk transition {task_id} finished with status {task['status']}")
+            return task
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"still {task.get('status')} after {JIRA_BULK_POLL_TIMEOUT:.0f}s")
+        await asyncio.sleep(JIRA_BULK_POLL_INTERVAL)
+
+
+async def get_issue_ids(client: JiraClient, limiter: RateLimiter, issue_keys: List[str]) -> Dict[str, str]:
+    search = await limiter.run(client.search_issues, f"key in ({', '.join(issue_keys)})", ['status'], len(issue_keys))
+    return {str(issue['id']): issue['key'] for issue in search.get('issues', [])}
+
+
+def collect_bulk_outcome(issue_keys: List[str], task: Dict, issue_ids: Dict[str, str], result: Dict) -> None:
+    processed = {issue_ids.get(str(issue_id), str(issue_id)) for issue_id in task.get('processedAccessibleIssues') or []}
+    failed = {
+        issue_ids.get(str(issue_id), str(issue_id)): errors
+        for issue_id, errors in (task.get('failedAccessibleIssues') or {}).items()
+    }
+    for issue_key in issue_keys:
+        if issue_key in failed:
+            errors = failed[issue_key]
+            error = "; ".join(map(str, errors)) if isinstance(errors, list) else str(errors)
+            result['failed'].append({'issue_key': issue_key, 'error': error or "Transition failed"})
+        elif issue_key in processed:
+            result['transitioned'].append(issue_key)
+        else:
+            result['failed'].append({
+                'issue_key': issue_key,
+                'error': f"Not transitioned (bulk operation {task.get('status', 'unknown').lower()})"
+            })
+
+
+async def transition_individually(client: JiraClient, limiter: RateLimiter, groups: Dict[str, List[str]],
+                                  result: Dict) -> None:
+    pairs = [(issue_key, transition_id) for transition_id, issue_keys in groups.items() for issue_key in issue_keys]
+    outcomes = await asyncio.gather(
+        *(limiter.run(client.transition_issue, issue_key, transition_id) for issue_key, transition_id in pairs),
+        return_exceptions=True
+    )
+    for (issue_key, _), outcome in zip(pairs, outcomes):
+        if isinstance(outcome, Exception):
+            result['failed'].append({'issue_key': issue_key, 'error': str(outcome)})
+        else:
+            result['transitioned'].append(issue_key)
+
+
+async def apply_comments(client: JiraClient, limiter: RateLimiter, changes: List[Dict], result: Dict) -> None:
+    changes = [change for change in changes if change.get('comment')]
+    outcomes = await asyncio.gather(
+        *(limiter.run(client.add_comment, change['issue_key'], change['comment']) for change in changes),
+        return_exceptions=True
+    )
+    for change, outcome in zip(changes, outcomes):
+        if isinstance(outcome, Exception):
+            result['failed'].append({'issue_key': change['issue_key'], 'error': str(outcome)})
+        else:
+            result['commented'].append(change['issue_key'])
+
+
+async def apply_change_set(credentials: Dict, changes: List[Dict]) -> Dict:
+    client = JiraClient(credentials['jira_url'], credentials['jira_cloud_id'], credentials['jira_token'],
+                        credentials.get('jira_account_id'))
+    limiter = RateLimiter()
+    result = {'transitioned': [], 'commented': [], 'failed': []}
+
+    started_at = time.monotonic()
+    await asyncio.gather(
+        apply_transitions(client, limiter, changes, result),
+        apply_comments(client, limiter, changes, result)
+    )
+    logger.info(
+        f"Applied change set in {time.monotonic() - started_at:.2f}s: {len(result['transitioned'])} transitioned, "
+        f"{len(result['commented'])} commented, {len(result['failed'])} failed"
+    )
+    return result
@@ -1,3 +1,5 @@
+import asyncio
+import hashlib
 import json
 import logging
 import os
@@ -7,6 +9,9 @@ import requests
 from langchain.tools import StructuredTool
 from pydantic import BaseModel, Field
 
+from .jira_cache import build_cache_key, normalize_fields, normalize_jql, response_cache
+from .token_budget import TOOL_OUTPUT_MAX_TOKENS, truncate_text
+
 logger = logging.getLogger(__name__)
 
 JIRA_AUTH_SERVER_URL = os.environ.get("JIRA_AUTH_SERVER_URL", "http://localhost:5000")
@@ -47,7 +52,8 @@ def get_user_jira_credentials(telegram_user_id: str) -> Optional[Dict]:
                     'jira_token': access_token,
                     'jira_username': data['jira_email'],
                     'jira_url': jira_url,
-                    'jira_cloud_id': cloud_id
+                    'jira_cloud_id': cloud_id,
+                    'jira_account_id': data.get('jira_account_id') or None
                 }
                 
                 logger.info(f"✅ Returning credentials with URL: {credentials['jira_url']}")
@@ -63,15 +69,50 @@ def get_user_jira_credentials(telegram_user_id: str) -> Optional[Dict]:
     return None
 
 
+def get_mirrored_issues(cloud_id: str, project_key: str, account_id: Optional[str]) -> Optional[Dict]:
+    if not INTERNAL_API_KEY or not account_id:
+        return None
+    
+    try:
+        response = requests.get(
+            f"{JIRA_AUTH_SERVER_URL}/mirror/{cloud_id}/issues",
+            params={'project': project_key, 'account': account_id},
+            headers={'Authorization': f'Bearer {INTERNAL_API_KEY}'},
+            timeout=5
+        )
+        if response.status_code == 200:
+            result = response.json()
+            if result.get('restricted'):
+                logger.info(f"{result['restricted']} mirrored issues have a security level, using Jira search instead")
+                return None
+            logger.info(f"Got {result['total']} issues from issue mirror (reconciled at {result.get('reconciled_at')})")
+            return result
+        logger.warning(f"Issue mirror unavailable: {response.status_code}")
+    except Exception as e:
+        logger.warning(f"Error getting mirrored issues: {e}")
+    return None
+
+
 class JiraClient:
     
-    def __init__(self, jira_url: str, cloud_id: str, access_token: str):
+    def __init__(self, jira_url: str, cloud_id: str, access_token: str, account_id: Optional[str] = None):
         self.jira_url = jira_url.rstrip('/')
         self.cloud_id = cloud_id
         self.access_token = access_token
+        self.cache_scope = account_id or f"token:{hashlib.sha256(access_token.encode()).hexdigest()[:16]}"
         self.base_url = f"https://api.atlassian.com/ex/jira/{cloud_id}/rest/api/3"
         logger.info(f"Initialized Jira client for {self.jira_url} (cloud {self.cloud_id})")
     
+    def _cached_request(self, method: str, endpoint: str, cache_params: Dict, **kwargs) -> Dict:
+        key = build_cache_key(self.cloud_id, self.cache_scope, endpoint, cache_params)
+        return response_cache.get_or_fetch(key, lambda: self._make_request(method, endpoint, **kwargs))
+    
+    def _write_request(self, method: str, endpoint: str, **kwargs) -> Dict:
+        try:
+            return self._make_request(method, endpoint, **kwargs)
+        finally:
+            response_cache.invalidate(self.cloud_id)
+    
     def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict:
         url = f"{self.base_url}{endpoint}"
         headers = {
@@ -102,12 +143,13 @@ class JiraClient:
         logger.info(f"Searching Jira: {jql}")
         
         payload = {
-            'jql': jql,
+            'jql': normalize_jql(jql),
             'maxResults': max_results,
             'fields': fields or ['summary', 'status', 'assignee', 'reporter', 'priority', 'issuetype', 'created', 'updated']
         }
+        cache_params = dict(payload, fields=normalize_fields(payload['fields']))
         
-        result = self._make_request('POST', '/search/jql', json=payload)
+        result = self._cached_request('POST', '/search/jql', cache_params, json=payload)
         issues = result.get('issues', []) or []
         result['total'] = result.get('total') or len(issues)
         logger.info(f"Found {result['total']} issues")
@@ -116,7 +158,8 @@ class JiraClient:
     def get_issue(self, issue_key: str, fields: Optional[List[str]] = None) -> Dict:
         logger.info(f"Getting issue: {issue_key}")
         params = {'fields': ','.join(fields)} if fields else {}
-        return self._make_request('GET', f'/issue/{issue_key}', params=params)
+        return self._cached_request('GET', f'/issue/{issue_key.strip().upper()}', {'fields': normalize_fields(fields)},
+                                    params=params)
     
     def create_issue(self, project_key: str, summary: str, issue_type: str = "Task", 
                      description: Optional[str] = None, **kwargs) -> Dict:
@@ -136,27 +179,62 @@ class JiraClient:
             }
         
         fields.update(kwargs)
-        return self._make_request('POST', '/issue', json={'fields': fields})
+        return self._write_request('POST', '/issue', json={'fields': fields})
     
     def update_issue(self, issue_key: str, fields: Dict) -> Dict:
         logger.info(f"Updating issue: {issue_key}")
-        self._make_request('PUT', f'/issue/{issue_key}', json={'fields': fields})
+        self._write_request('PUT', f'/issue/{issue_key}', json={'fields': fields})
         return {'success': True, 'key': issue_key}
+    
+    def get_transitions(self, issue_key: str) -> List[Dict]:
+        logger.info(f"Getting transitions for issue: {issue_key}")
+        return self._make_request('GET', f'/issue/{issue_key}/transitions').get('transitions', [])
+    
+    def transition_issue(self, issue_key: str, transition_id: str) -> Dict:
+        logger.info(f"Transitioning issue {issue_key} with transition {transition_id}")
+        self._write_request('POST', f'/issue/{issue_key}/transitions', json={'transition': {'id': transition_id}})
+        return {'success': True, 'key': issue_key}
+    
+    def bulk_transition_issues(self, transitions: Dict[str, List[str]]) -> Dict:
+        logger.info(f"Bulk transitioning {sum(len(keys) for keys in transitions.values())} issues")
+        payload = {
+            'bulkTransitionInputs': [
+                {'selectedIssueIdsOrKeys': issue_keys, 'transitionId': transition_id}
+                for transition_id, issue_keys in transitions.items()
+            ],
+            'sendBulkNotification': False
+        }
+        return self._write_request('POST', '/bulk/issues/transition', json=payload)
+    
+    def get_bulk_task(self, task_id: str) -> Dict:
+        logger.info(f"Getting bulk operation progress: {task_id}")
+        return self._make_request('GET', f'/bulk/queue/{task_id}')
+    
+    def add_comment(self, issue_key: str, comment: str) -> Dict:
+        logger.info(f"Adding comment to issue: {issue_key}")
+        body = {
+            'type': 'doc',
+            'version': 1,
+            'content': [{'type': 'paragraph', 'content': [{'type': 'text', 'text': comment}]}]
+        }
+        return self._write_request('POST', f'/issue/{issue_key}/comment', json={'body': body})
 
 
 def create_tool_wrapper(func: Callable, error_prefix: str) -> Callable:
     def wrapper(*args, **kwargs) -> str:
         try:
             result = func(*args, **kwargs)
-            return json.dumps(result, indent=2, ensure_ascii=False) if isinstance(result, dict) else result
+            result = json.dumps(result, indent=2, ensure_ascii=False) if isinstance(result, dict) else result
+            return truncate_text(result, TOOL_OUTPUT_MAX_TOKENS)
         except Exception as e:
             return f"{error_prefix}: {str(e)}"
     return wrapper
 
 
-def create_jira_langchain_tools(jira_url: str, cloud_id: str, access_token: str) -> List[StructuredTool]:
+def create_jira_langchain_tools(jira_url: str, cloud_id: str, access_token: str,
+                                account_id: Optional[str] = None) -> List[StructuredTool]:
     
-    client = JiraClient(jira_url, cloud_id, access_token)
+    client = JiraClient(jira_url, cloud_id, access_token, account_id)
     
     class SearchIssuesInput(BaseModel):
         jql: str = Field(description="JQL query to search for issues. Examples: 'project = TestProject', 'assignee = currentUser()', 'status = \"In Progress\"'")
@@ -199,23 +277,35 @@ def create_jira_langchain_tools(jira_url: str, cloud_id: str, access_token: str)
         except:
             return result
     
+    async def search_issues_tool_async(jql: str, max_results: int = 50) -> str:
+        return await asyncio.to_thread(search_issues_tool, jql, max_results)
+    
+    async def get_issue_tool_async(issue_key: str) -> str:
+        return await asyncio.to_thread(get_issue_tool, issue_key)
+    
+    async def create_issue_tool_async(project_key: str, summary: str, issue_type: str = "Task", description: Optional[str] = None) -> str:
+        return await asyncio.to_thread(create_issue_tool, project_key, summary, issue_type, description)
+    
     tools = [
         StructuredTool(
             name="search_jira_issues",
             description="Search for Jira issues using JQL (Jira Query Language). Use this to find issues by project, status, assignee, labels, etc.",
             func=search_issues_tool,
+            coroutine=search_issues_tool_async,
             args_schema=SearchIssuesInput
         ),
         StructuredTool(
             name="get_jira_issue",
             description="Get detailed information about a specific Jira issue by its key (e.g., SMS-123)",
             func=get_issue_tool,
+            coroutine=get_issue_tool_async,
             args_schema=GetIssueInput
         ),
         StructuredTool(
             name="create_jira_issue",
             description="Create a new Jira issue. Specify project key, summary, type (Task/Bug/Story), and optional description.",
             func=create_issue_tool,
+            coroutine=create_issue_tool_async,
             args_schema=CreateIssueInput
         )
     ]
@@ -1,20 +1,31 @@
+import asyncio
+import json
 import logging
 import os
+import re
+import time
 import traceback
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple, Union
 
-from langchain.agents import AgentType, initialize_agent
 from langchain.schema import HumanMessage, SystemMessage
 from langchain.tools import StructuredTool
-from langchain_openai import ChatOpenAI
 
-from .jira_tools import create_jira_langchain_tools, get_user_jira_credentials
+from .agent_runner import run_agent
+from .issue_index import IssueIndex
+from .jira_tools import JiraClient, create_jira_langchain_tools, get_mirrored_issues, get_user_jira_credentials
+from .model_router import create_chat_model, get_selectable_models, routing_stats, triage_messages
+from .token_budget import (LLM_MAX_INPUT_TOKENS, LLM_MAX_OUTPUT_TOKENS, RequestUsage, TokenBudgetExceeded,
+                           count_tokens, trim_history, usage_meter)
+from .trace_recorder import finish_trace, record_issues, record_llm_call, start_trace
 
 logger = logging.getLogger(__name__)
 
 PROMPT_FILE_USER = "LLM/prompt_user.txt"
 PROMPT_FILE_SYSTEM = "LLM/prompt_system.txt"
 SYSTEM_PROMPT_DEFAULT = "You are an AI assistant specialized in analyzing chat conversations and identifying task agreements."
+JIRA_PROJECT_KEY = os.environ.get("JIRA_PROJECT_KEY", "BriefChiefTest")
+ISSUE_INDEX_MAX_RESULTS = int(os.environ.get("ISSUE_INDEX_MAX_RESULTS", "100"))
+ISSUE_MIRROR_ENABLED = os.environ.get("ISSUE_MIRROR_ENABLED", "true").lower() == "true"
 
 def load_prompt_from_file(filename: str = PROMPT_FILE_SYSTEM) -> str:
     if os.path.exists(filename):
@@ -22,10 +33,14 @@ def load_prompt_from_file(filename: str = PROMPT_FILE_SYSTEM) -> str:
             return f.read().strip()
     return ""
 
+def count_prompt_tokens() -> int:
+    system_prompt = load_prompt_from_file(PROMPT_FILE_SYSTEM) or SYSTEM_PROMPT_DEFAULT
+    return count_tokens(system_prompt) + count_tokens(load_prompt_from_file(PROMPT_FILE_USER))
+
 def get_available_models() -> Dict[str, str]:
-    return {"model_openai": "OpenAI"}
+    return get_selectable_models()
 
-def collect_tools(telegram_user_id: Optional[str] = None) -> List[StructuredTool]:
+def collect_tools(telegram_user_id: Optional[str] = None, credentials: Optional[Dict] = None) -> List[StructuredTool]:
     tools = []
     
     if not telegram_user_id:
@@ -33,15 +48,18 @@ def collect_tools(telegram_user_id: Optional[str] = None) -> List[StructuredTool
         return tools
     
     try:
-        logger.info(f"Getting Jira credentials for user {telegram_user_id}...")
-        if credentials := get_user_jira_credentials(telegram_user_id):
+        if credentials is None:
+            logger.info(f"Getting Jira credentials for user {telegram_user_id}...")
+            credentials = get_user_jira_credentials(telegram_user_id)
+        if credentials:
             logger.info(f"📋 Creating Jira tools with OAuth 2.0 Bearer token")
             logger.info(f"   URL: {credentials['jira_url']}")
             
             jira_tools = create_jira_langchain_tools(
                 jira_url=credentials['jira_url'],
                 cloud_id=credentials['jira_cloud_id'],
-                access_token=credentials['jira_token']
+                access_token=credentials['jira_token'],
+                account_id=credentials.get('jira_account_id')
             )
             tools.extend(jira_tools)
             logger.info(f"✅ Successfully created {len(jira_tools)} Jira tools")
@@ -53,12 +71,59 @@ def collect_tools(telegram_user_id: Optional[str] = None) -> List[StructuredTool
     
     return tools
 
-async def call_llm(messages: str, llm_choice: str = "model_openai", tools: Optional[List[StructuredTool]] = None) -> str:
+def fetch_project_issues(credentials: Dict) -> Optional[Dict]:
+    if ISSUE_MIRROR_ENABLED:
+        account_id = credentials.get('jira_account_id')
+        if result := get_mirrored_issues(credentials['jira_cloud_id'], JIRA_PROJECT_KEY, account_id):
+            return result
+    
+    try:
+        client = JiraClient(credentials['jira_url'], credentials['jira_cloud_id'], credentials['jira_token'],
+                            credentials.get('jira_account_id'))
+        return client.search_issues(f'project = "{JIRA_PROJECT_KEY}"', max_results=ISSUE_INDEX_MAX_RESULTS)
+    except Exception as e:
+        logger.warning(f"Issue index not available, using full chat history: {e}")
+        return None
+
+def build_issue_context(messages: str, index: Optional[IssueIndex], issue_keys: Optional[List[str]] = None,
+                        fallback: Optional[str] = None) -> str:
+    fallback = messages if fallback is None else fallback
+    if index is None:
+        return fallback
+    if not (context := index.build_context(messages, issue_keys)):
+        logger.info("No chat lines matched the selected Jira issues, using the unrouted context")
+        return fallback
+    context = f"Chat lines grouped by related Jira issue:\n\n{context}"
+    if len(context) >= len(messages):
+        logger.info(f"Issue bundles ({len(context)} characters) are not smaller than the chat history "
+                    f"({len(messages)} characters), using the unrouted context")
+        return fallback
+    logger.info(f"Narrowed chat history from {len(messages)} to {len(context)} characters")
+    return context
+
+def parse_brief_response(response: str) -> List[Dict]:
+    if not (match := re.search(r'\{.*\}', response, re.DOTALL)):
+        raise ValueError("LLM response does not contain a JSON object")
+    
+    agreements = []
+    for item in json.loads(match.group(0)).get('agreements') or []:
+        agreements.append({
+            'task': str(item.get('task') or '').strip(),
+            'issue_key': str(item['issue_key']).strip().upper() if item.get('issue_key') else None,
+            'new_status': str(item['new_status']).strip() if item.get('new_status') else None,
+            'comment': str(item.get('comment') or '').strip()
+        })
+    return agreements
+
+async def call_llm(messages: str, llm_choice: str = "model_openai", tools: Optional[List[StructuredTool]] = None,
+                   usage: Optional[RequestUsage] = None) -> str:
     if llm_choice not in get_available_models():
         return f"Unknown LLM choice: {llm_choice}. Available options: {', '.join(get_available_models().keys())}"
 
     if tools is None:
         tools = []
+    if usage is None:
+        usage = RequestUsage()
     
     try:
         system_prompt = load_prompt_from_file(PROMPT_FILE_SYSTEM) or SYSTEM_PROMPT_DEFAULT
@@ -70,26 +135,21 @@ async def call_llm(messages: str, llm_choice: str = "model_openai", tools: Optio
             HumanMessage(content=user_prompt + messages)
         ]
         
-        llm = ChatOpenAI(model="gpt-4o", max_tokens=8000)
-        logger.info("Initialized OpenAI LLM")
+        llm = create_chat_model(llm_choice, LLM_MAX_OUTPUT_TOKENS)
+        logger.info(f"Initialized {llm_choice} LLM")
 
         if tools:
-            logger.info(f"Initializing LangChain agent with {len(tools)} tools...")
-            agent = initialize_agent(
-                tools=tools,
-                llm=llm,
-                agent=AgentType.OPENAI_FUNCTIONS,
-                verbose=True,
-                handle_parsing_errors=True,
-                max_iterations=10,
-                return_intermediate_steps=False
-            )
-            logger.info("Running agent with tools...")
-            response = await agent.arun(langchain_messages[-1].content)
+            logger.info(f"Running agent with {len(tools)} tools...")
+            response = await run_agent(llm, tools, langchain_messages, usage=usage)
             logger.info("Agent completed successfully")
         else:
             logger.info("Using basic LLM without tools...")
-            response = await llm.ainvoke(langchain_messages)
+            if not usage.fits(langchain_messages):
+                raise TokenBudgetExceeded(f"Brief input budget of {usage.max_input_tokens} tokens exceeded")
+            started_at = time.monotonic()
+            response = await llm.bind(response_format={"type": "json_object"}).ainvoke(langchain_messages)
+            record_llm_call(llm.model_name, response, time.monotonic() - started_at)
+            usage.record(langchain_messages, response)
             response = response.content
             logger.info("Basic LLM completed successfully")
         
@@ -99,14 +159,72 @@ async def call_llm(messages: str, llm_choice: str = "model_openai", tools: Optio
         logger.error(f"Traceback: {traceback.format_exc()}")
         return f"Error calling LLM: {str(e)}"
 
-async def handle_llm_command(messages: str, llm_choice: str = "model_openai", telegram_user_id: Optional[str] = None) -> tuple[str, bool]:
+async def process_brief(messages: str, llm_choice: str, telegram_user_id: Optional[str], chat_id: Optional[str],
+                        credentials: Optional[Dict], tools: List[StructuredTool], issues: Optional[Dict]) -> Tuple[Union[Dict, str], bool]:
+    started_at = time.monotonic()
+    usage = RequestUsage()
+    history_budget = max(LLM_MAX_INPUT_TOKENS - count_prompt_tokens(), 0)
+    messages = trim_history(messages, history_budget)
+    
+    if issues is None and credentials:
+        issues = await asyncio.to_thread(fetch_project_issues, credentials)
+    index = IssueIndex.from_search_result(issues) if issues is not None else None
+    if issues is not None:
+        record_issues(issues)
+    context = trim_history(build_issue_context(messages, index), history_budget)
+    
+    decision = await triage_messages(context, usage)
+    if decision['has_agreements'] and decision['issues'] and index is not None:
+        routed_context = trim_history(
+            build_issue_context(messages, index, decision['issues'], fallback=context), history_budget
+        )
+    else:
+        routed_context = context
+    routing_stats.record(
+        decision,
+        count_tokens(context),
+        count_tokens(routed_context) if decision['has_agreements'] else 0,
+        usage.input_tokens + usage.output_tokens
+    )
+    brief = {'agreements': [], 'jira_url': credentials['jira_url'] if credentials else None}
+    if not decision['has_agreements']:
+        usage_meter.record(telegram_user_id, chat_id, usage.input_tokens, usage.output_tokens,
+                           time.monotonic() - started_at)
+        return brief, True
+    
+    response = await call_llm(routed_context, llm_choice, tools, usage)
+    usage_meter.record(telegram_user_id, chat_id, usage.input_tokens, usage.output_tokens,
+                       time.monotonic() - started_at)
+    try:
+        brief['agreements'] = parse_brief_response(response)
+    except ValueError as e:
+        logger.error(f"Could not parse LLM response: {e}")
+        return response, False
+    return brief, True
+
+async def handle_llm_command(messages: str, llm_choice: str = "model_openai", telegram_user_id: Optional[str] = None,
+                             chat_id: Optional[str] = None, credentials: Optional[Dict] = None,
+                             tools: Optional[List[StructuredTool]] = None,
+                             issues: Optional[Dict] = None) -> Tuple[Union[Dict, str], bool]:
     if not messages or messages == "No new messages since last call.":
         return "No new messages since last call.", False
     
+    if quota_error := usage_meter.check_quota(telegram_user_id, chat_id):
+        logger.warning(f"Quota exceeded for user {telegram_user_id}, chat {chat_id}")
+        return quota_error, False
+    
+    success = False
     try:
-        tools = collect_tools(telegram_user_id)
-        response = await call_llm(messages, llm_choice, tools)
-        return f"Found task agreements:\n\n{response}", True
+        if credentials is None and telegram_user_id:
+            credentials = await asyncio.to_thread(get_user_jira_credentials, telegram_user_id)
+        if tools is None:
+            tools = collect_tools(telegram_user_id, credentials)
+        
+        start_trace(messages, llm_choice, telegram_user_id, chat_id, [tool.name for tool in tools])
+        response, success = await process_brief(messages, llm_choice, telegram_user_id, chat_id, credentials, tools, issues)
+        return response, success
     except Exception as e:
         logger.error(f"Error processing messages with LLM: {e}")
         return f"Error processing messages: {str(e)}", False
+    finally:
+        finish_trace(success)
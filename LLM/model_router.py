@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import re
+import time
+from typing import Callable, Dict, Optional
+
+from langchain.schema import HumanMessage, SystemMessage
+from langchain_openai import ChatOpenAI
+
+from .token_budget import RequestUsage
+from .trace_recorder import record_llm_call
+
+logger = logging.getLogger(__name__)
+
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL") or None
+TRIAGE_ENABLED = os.environ.get("TRIAGE_ENABLED", "true").lower() == "true"
+
+MODEL_REGISTRY: Dict[str, Dict] = {
+    "model_openai": {
+        "name": "OpenAI",
+        "model": os.environ.get("OPENAI_MODEL", "gpt-4o"),
+        "max_tokens": 8000,
+        "selectable": True,
+    },
+    "model_triage": {
+        "name": "OpenAI triage",
+        "model": os.environ.get("TRIAGE_MODEL", "gpt-4o-mini"),
+        "max_tokens": 300,
+        "selectable": False,
+    },
+}
+TRIAGE_MODEL_ID = "model_triage"
+
+TRIAGE_PROMPT = """You are a fast triage filter for a team chat analyzer.
+Decide whether the chat history below contains any agreements on tasks, deadlines, responsibilities or decisions about work items.
+If the chat is grouped by Jira issue, list only the keys of issues that have such agreements.
+Respond with JSON only, without any other text: {"has_agreements": true|false, "issues": ["KEY-1", ...]}"""
+
+
+_chat_model_factory: Optional[Callable[[str, int], ChatOpenAI]] = None
+
+
+def get_model_config(model_id: str) -> Dict:
+    return MODEL_REGISTRY[model_id]
+
+
+def set_chat_model_factory(factory: Optional[Callable[[str, int], ChatOpenAI]]) -> None:
+    global _chat_model_factory
+    _chat_model_factory = factory
+
+
+def create_chat_model(model_id: str, max_tokens: Optional[int] = None) -> ChatOpenAI:
+    config = get_model_config(model_id)
+    base_url = config.get("base_url") or LLM_BASE_URL
+    max_tokens = min(config["max_tokens"], max_tokens) if max_tokens else config["max_tokens"]
+    if _chat_model_factory is not None:
+        return _chat_model_factory(model_id, max_tokens)
+    logger.info(f"Creating chat model {config['model']} for {model_id}" + (f" at {base_url}" if base_url else ""))
+    return ChatOpenAI(model=config["model"], max_tokens=max_tokens, base_url=base_url)
+
+
+class RoutingStats:
+
+    def __init__(self):
+        self.total = 0
+        self.skipped = 0
+        self.narrowed = 0
+        self.escalated = 0
+        self.triage_failed = 0
+        self.saved_tokens = 0
+
+    def record(self, decision: Dict, input_tokens: int, routed_tokens: int, triage_tokens: int = 0) -> None:
+        self.total += 1
+        if decision.get("error"):
+            self.triage_failed += 1
+        if not decision["has_agreements"]:
+            self.skipped += 1
+        else:
+            self.escalated += 1
+            if routed_tokens < input_tokens:
+                self.narrowed += 1
+        self.saved_tokens += input_tokens - routed_tokens - triage_tokens
+        logger.info(
+            f"Routing decision: has_agreements={decision['has_agreements']}, issues={decision['issues']}, "
+            f"input_tokens~{input_tokens}, routed_tokens~{routed_tokens}, triage_tokens={triage_tokens}, "
+            f"saved_tokens_total~{self.saved_tokens}"
+        )
+
+    def as_dict(self) -> Dict:
+        return {
+            "total": self.total,
+            "skipped": self.skipped,
+            "narrowed": self.narrowed,
+            "escalated": self.escalated,
+            "triage_failed": self.triage_failed,
+            "saved_tokens": self.saved_tokens,
+        }
+
+
+routing_stats = RoutingStats()
+
+
+def get_routing_stats() -> Dict:
+    return routing_stats.as_dict()
+
+
+def parse_triage_response(content: str) -> Dict:
+    if match := re.search(r'\{.*\}', content, re.DOTALL):
+        data = json.loads(match.group(0))
+        issues = [str(key).upper() for key in data.get("issues") or []]
+        return {"has_agreements": bool(data.get("has_agreements")), "issues": issues}
+    raise ValueError(f"Triage response is not JSON: {content[:200]}")
+
+
+async def triage_messages(messages: str, usage: Optional[RequestUsage] = None) -> Dict:
+    if not TRIAGE_ENABLED:
+        return {"has_agreements": True, "issues": []}
+
+    try:
+        llm = create_chat_model(TRIAGE_MODEL_ID)
+        prompt = [SystemMessage(content=TRIAGE_PROMPT), HumanMessage(content=messages)]
+        started_at = time.monotonic()
+        response = await llm.ainvoke(prompt)
+        record_llm_call(llm.model_name, response, time.monotonic() - started_at)
+        if usage is not None:
+            usage.record(prompt, response)
+        return parse_triage_response(response.content)
+    except Exception as e:
+        logger.warning(f"Triage failed, escalating to the main model: {e}")
+        return {"has_agreements": True, "issues": [], "error": str(e)}
+
+
+def get_selectable_models() -> Dict[str, str]:
+    return {model_id: config["name"] for model_id, config in MODEL_REGISTRY.items() if config["selectable"]}
+
@@ -0,0 +1,140 @@
+import logging
+import os
+from collections import defaultdict
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _encoding = None
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+LLM_MAX_INPUT_TOKENS = int(os.environ.get("LLM_MAX_INPUT_TOKENS", "12000"))
+LLM_MAX_OUTPUT_TOKENS = int(os.environ.get("LLM_MAX_OUTPUT_TOKENS", "2000"))
+TOOL_OUTPUT_MAX_TOKENS = int(os.environ.get("TOOL_OUTPUT_MAX_TOKENS", "3000"))
+LLM_MAX_REQUEST_TOKENS = int(os.environ.get("LLM_MAX_REQUEST_TOKENS", "48000"))
+MESSAGE_OVERHEAD_TOKENS = 4
+TRUNCATION_MARKER = "\n[truncated]"
+USER_DAILY_TOKEN_QUOTA = int(os.environ.get("USER_DAILY_TOKEN_QUOTA", "0"))
+CHAT_DAILY_TOKEN_QUOTA = int(os.environ.get("CHAT_DAILY_TOKEN_QUOTA", "0"))
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def count_message_tokens(messages: List[Any]) -> int:
+    return sum(count_tokens(str(message.content)) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+    keep = max(max_tokens - count_tokens(TRUNCATION_MARKER), 0)
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text, disallowed_special=())[:keep]) + TRUNCATION_MARKER
+    return text[:keep * CHARS_PER_TOKEN] + TRUNCATION_MARKER
+
+
+def trim_history(messages: str, max_tokens: int) -> str:
+    lines = messages.splitlines()
+    total = sum(count_tokens(line) + 1 for line in lines)
+    start = 0
+    while total > max_tokens and start < len(lines) - 1:
+        total -= count_tokens(lines[start]) + 1
+        start += 1
+
+    if start:
+        logger.info(f"Trimmed {start} oldest chat lines to fit {max_tokens} token budget")
+    trimmed = "\n".join(lines[start:])
+    return truncate_text(trimmed, max_tokens)
+
+
+class TokenBudgetExceeded(Exception):
+    pass
+
+
+class RequestUsage:
+
+    def __init__(self, max_input_tokens: int = LLM_MAX_REQUEST_TOKENS):
+        self.max_input_tokens = max_input_tokens
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.calls = 0
+
+    @property
+    def remaining_input_tokens(self) -> int:
+        return max(self.max_input_tokens - self.input_tokens, 0)
+
+    def fits(self, messages: List[Any]) -> bool:
+        return count_message_tokens(messages) <= self.remaining_input_tokens
+
+    def record(self, messages: List[Any], response: Any) -> None:
+        usage = getattr(response, 'usage_metadata', None) or {}
+        self.input_tokens += usage.get('input_tokens') or count_message_tokens(messages)
+        self.output_tokens += usage.get('output_tokens') or count_tokens(str(response.content))
+        self.calls += 1
+
+
+class UsageMeter:
+
+    def __init__(self, user_quota: int = USER_DAILY_TOKEN_QUOTA, chat_quota: int = CHAT_DAILY_TOKEN_QUOTA):
+        self.user_quota = user_quota
+        self.chat_quota = chat_quota
+        self._day = date.today()
+        self._daily_tokens: Dict[str, int] = defaultdict(int)
+        self._totals: Dict[str, Dict] = defaultdict(lambda: {
+            'requests': 0, 'input_tokens': 0, 'output_tokens': 0, 'latency_seconds': 0.0
+        })
+
+    def _roll_day(self) -> None:
+        if (today := date.today()) != self._day:
+            self._day = today
+            self._daily_tokens.clear()
+
+    def check_quota(self, telegram_user_id: Optional[str], chat_id: Optional[str]) -> Optional[str]:
+        self._roll_day()
+        if self.user_quota and telegram_user_id and self._daily_tokens[f"user:{telegram_user_id}"] >= self.user_quota:
+            return f"Daily token quota of {self.user_quota} exceeded for this user, try again tomorrow."
+        if self.chat_quota and chat_id and self._daily_tokens[f"chat:{chat_id}"] >= self.chat_quota:
+            return f"Daily token quota of {self.chat_quota} exceeded for this chat, try again tomorrow."
+        return None
+
+    def record(self, telegram_user_id: Optional[str], chat_id: Optional[str], input_tokens: int,
+               output_tokens: int, latency_seconds: float) -> None:
+        self._roll_day()
+        for scope in (f"user:{telegram_user_id}" if telegram_user_id else None, f"chat:{chat_id}" if chat_id else None):
+            if scope is None:
+                continue
+            self._daily_tokens[scope] += input_tokens + output_tokens
+            totals = self._totals[scope]
+            totals['requests'] += 1
+            totals['input_tokens'] += input_tokens
+            totals['output_tokens'] += output_tokens
+            totals['latency_seconds'] += latency_seconds
+        logger.info(
+            f"Usage for user {telegram_user_id}, chat {chat_id}: {input_tokens} input tokens, "
+            f"{output_tokens} output tokens, {latency_seconds:.2f}s"
+        )
+
+    def as_dict(self) -> Dict:
+        return {
+            scope: dict(totals, tokens_today=self._daily_tokens.get(scope, 0))
+            for scope, totals in self._totals.items()
+        }
+
+
+usage_meter = UsageMeter()
+
+
+def get_usage_stats() -> Dict:
+    return usage_meter.as_dict()
+
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BRIEF_TRACE_FILE = os.environ.get("BRIEF_TRACE_FILE", "")
+BRIEF_TRACE_INCLUDE_TEXT = os.environ.get("BRIEF_TRACE_INCLUDE_TEXT", "false").lower() == "true"
+EMAIL_PATTERN = re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]+')
+JSON_OBJECT_PATTERN = re.compile(r'\{.*\}', re.DOTALL)
+STRUCTURAL_KEYS = frozenset({'issue_key', 'new_status', 'has_agreements', 'issues'})
+
+_current_trace: ContextVar[Optional[Dict]] = ContextVar("brief_trace", default=None)
+_write_lock = threading.Lock()
+
+
+def hash_value(value: Optional[str]) -> Optional[str]:
+    return hashlib.sha256(value.encode()).hexdigest()[:16] if value else None
+
+
+def sanitize(value: Any) -> Any:
+    if isinstance(value, str):
+        return EMAIL_PATTERN.sub("<email>", value)
+    if isinstance(value, dict):
+        return {key: sanitize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [sanitize(item) for item in value]
+    return value
+
+
+def redact(value: Any, keep_keys: frozenset = frozenset()) -> Any:
+    if isinstance(value, str):
+        return hash_value(value)
+    if isinstance(value, dict):
+        return {key: item if key in keep_keys else redact(item, keep_keys) for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact(item, keep_keys) for item in value]
+    return value
+
+
+def scrub_text(text: str) -> str:
+    if BRIEF_TRACE_INCLUDE_TEXT:
+        return sanitize(text)
+    if (match := JSON_OBJECT_PATTERN.search(text or "")):
+        try:
+            return json.dumps(redact(json.loads(match.group(0)), STRUCTURAL_KEYS), ensure_ascii=False)
+        except json.JSONDecodeError:
+            pass
+    return f"<redacted {len(text)} chars>" if text else text
+
+
+def scrub_args(args: Dict) -> Dict:
+    return sanitize(args) if BRIEF_TRACE_INCLUDE_TEXT else redact(args)
+
+
+def scrub_issues(result: Dict) -> Dict:
+    if BRIEF_TRACE_INCLUDE_TEXT:
+        return sanitize(result)
+    issues = [
+        {'key': issue['key'], 'fields': {'status': {'name': ((issue.get('fields') or {}).get('status') or {}).get('name')}}}
+        for issue in result.get('issues') or []
+    ]
+    return {'issues': issues, 'total': result.get('total', len(issues))}
+
+
+def start_trace(messages: str, llm_choice: str, telegram_user_id: Optional[str], chat_id: Optional[str],
+                tool_names: List[str]) -> None:
+    if not BRIEF_TRACE_FILE:
+        return
+
+    _current_trace.set({
+        'trace_id': uuid.uuid4().hex,
+        'started_at': time.time(),
+        'llm_choice': llm_choice,
+        'user': hash_value(telegram_user_id),
+        'chat': hash_value(chat_id),
+        'transcript_sha256': hashlib.sha256(messages.encode()).hexdigest(),
+        'transcript_chars': len(messages),
+        'transcript': sanitize(messages) if BRIEF_TRACE_INCLUDE_TEXT else None,
+        'tools': tool_names,
+        'issues': None,
+        'llm_calls': [],
+        'tool_calls': [],
+        '_started': time.monotonic()
+    })
+
+
+def record_issues(result: Dict) -> None:
+    if trace := _current_trace.get():
+        trace['issues'] = scrub_issues(result)
+
+
+def record_llm_call(model: Optional[str], response: Any, elapsed: float) -> None:
+    if trace := _current_trace.get():
+        trace['llm_calls'].append({
+            'model': model,
+            'content': scrub_text(response.content),
+            'tool_calls': [
+                dict(call, args=scrub_args(call.get('args') or {}))
+                for call in getattr(response, 'tool_calls', None) or []
+            ],
+            'elapsed': round(elapsed, 4)
+        })
+
+
+def record_tool_call(name: str, args: Dict, result: str, elapsed: float) -> None:
+    if trace := _current_trace.get():
+        trace['tool_calls'].append({
+            'name': name,
+            'args': scrub_args(args),
+            'result': sanitize(result) if BRIEF_TRACE_INCLUDE_TEXT else None,
+            'result_chars': len(result),
+            'elapsed': round(elapsed, 4)
+        })
+
+
+def finish_trace(success: bool) -> None:
+    if not (trace := _current_trace.get()):
+        return
+    _current_trace.set(None)
+
+    trace['duration'] = round(time.monotonic() - trace.pop('_started'), 4)
+    trace['success'] = success
+    try:
+        with _write_lock, open(BRIEF_TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(trace, ensure_ascii=False) + "\n")
+    except Exception as e:
+        logger.error(f"Error writing brief trace: {e}")
@@ -0,0 +1,134 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set
+
+from LLM import get_user_jira_credentials, handle_llm_command
+from LLM.llm_handler import fetch_project_issues
+from LLM.token_budget import LLM_MAX_INPUT_TOKENS, trim_history
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT_EXTENSIONS = (".txt", ".json")
+
+
+def extract_export_text(text) -> str:
+    if isinstance(text, list):
+        return "".join(part if isinstance(part, str) else part.get('text', '') for part in text)
+    return text or ""
+
+
+def read_transcript(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        if not path.endswith(".json"):
+            return f.read()
+        export = json.load(f)
+
+    lines = []
+    for message in export.get('messages', []):
+        if message.get('type', 'message') == 'message' and (text := extract_export_text(message.get('text'))):
+            lines.append(f"{message.get('from') or 'Unknown'}: {text}")
+    return "\n".join(lines)
+
+
+def preprocess_transcript(path: str) -> Dict:
+    transcript = "\n".join(" ".join(line.split()) for line in read_transcript(path).splitlines() if line.strip())
+    return {
+        'sha256': hashlib.sha256(transcript.encode()).hexdigest(),
+        'transcript': trim_history(transcript, LLM_MAX_INPUT_TOKENS)
+    }
+
+
+def find_transcripts(input_dir: str) -> List[str]:
+    paths = []
+    for root, _, filenames in os.walk(input_dir):
+        paths.extend(os.path.join(root, name) for name in filenames if name.endswith(TRANSCRIPT_EXTENSIONS))
+    return sorted(paths)
+
+
+def load_processed(output: str) -> Set[str]:
+    processed = set()
+    if os.path.exists(output):
+        with open(output, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get('success'):
+                    processed.add(record['file'])
+    return processed
+
+
+async def process_file(path: str, input_dir: str, args: argparse.Namespace, executor: ProcessPoolExecutor,
+                       semaphore: asyncio.Semaphore, output_file, credentials: Optional[Dict],
+                       issues: Optional[Dict]) -> None:
+    relative_path = os.path.relpath(path, input_dir)
+    loop = asyncio.get_running_loop()
+    started_at = time.monotonic()
+    record = {'file': relative_path}
+    try:
+        preprocessed = await loop.run_in_executor(executor, preprocess_transcript, path)
+        async with semaphore:
+            started_at = time.monotonic()
+            response, success = await handle_llm_command(
+                preprocessed['transcript'],
+                args.model,
+                args.user_id,
+                credentials=credentials,
+                issues=issues
+            )
+        record.update({'sha256': preprocessed['sha256'], 'success': success})
+        record['brief' if success else 'error'] = response
+    except Exception as e:
+        logger.error(f"Error processing {relative_path}: {e}")
+        record.update({'success': False, 'error': str(e)})
+    record['duration'] = round(time.monotonic() - started_at, 3)
+
+    output_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    output_file.flush()
+    logger.info(f"Processed {relative_path} in {record['duration']}s (success: {record['success']})")
+
+
+async def run_batch(args: argparse.Namespace) -> None:
+    paths = find_transcripts(args.input_dir)
+    processed = load_processed(args.output)
+    pending = [path for path in paths if os.path.relpath(path, args.input_dir) not in processed]
+    logger.info(f"Found {len(paths)} transcripts, {len(processed)} already done, {len(pending)} to process")
+    if not pending:
+        return
+
+    credentials = get_user_jira_credentials(args.user_id) if args.user_id else None
+    issues = fetch_project_issues(credentials) if credentials else None
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    with ProcessPoolExecutor(max_workers=args.workers) as executor, \
+            open(args.output, "a", encoding="utf-8") as output_file:
+        await asyncio.gather(*(
+            process_file(path, args.input_dir, args, executor, semaphore, output_file, credentials, issues)
+            for path in pending
+        ))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run briefs over a directory of exported chat transcripts")
+    parser.add_argument("input_dir", help="Directory with .txt transcripts or Telegram Desktop .json exports")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL results file, appended on resume")
+    parser.add_argument("--model", default="model_openai", help="Model id (default: model_openai)")
+    parser.add_argument("--user-id", help="Telegram user id whose Jira authorization is used")
+    parser.add_argument("--concurrency", type=int, default=4, help="Brief LLM calls run in parallel (default: 4)")
+    parser.add_argument("--workers", type=int, default=None, help="Preprocessing processes (default: CPU count)")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run_batch(args))
+    except KeyboardInterrupt:
+        logger.warning("Interrupted, rerun with the same --output to resume")
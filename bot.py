@@ -1,15 +1,21 @@
 import asyncio
+import html
+import json
 import logging
 import os
-from typing import Optional, Tuple
+import time
+import uuid
+from typing import Dict, Optional, Tuple
 
 import requests
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
-from telethon import TelegramClient
+from telethon import TelegramClient, events
 from telethon.sessions import StringSession
 
-from LLM import get_available_models, handle_llm_command
+from brief_renderer import TELEGRAM_MESSAGE_LIMIT, render_brief, render_text
+from chat_archive import ChatArchive
+import LLM
 from messages import get_message, get_user_language
 
 logging.basicConfig(
@@ -22,14 +28,84 @@ API_ID = int(os.environ.get("TELEGRAM_API_ID", "0"))
 API_HASH = os.environ.get("TELEGRAM_API_HASH", "")
 SESSION_STRING = os.environ.get("TELEGRAM_SESSION_STRING", "")
 JIRA_AUTH_SERVER_URL = os.environ.get("JIRA_AUTH_SERVER_URL", "http://localhost:5000")
+BOT_READY_FILE = os.environ.get("BOT_READY_FILE", "")
+PREFETCH_TTL_SECONDS = float(os.environ.get("PREFETCH_TTL_SECONDS", "60"))
+PREFETCH_JIRA_SNAPSHOT = os.environ.get("PREFETCH_JIRA_SNAPSHOT", "true").lower() == "true"
+CHANGE_SET_TTL_SECONDS = float(os.environ.get("CHANGE_SET_TTL_SECONDS", "86400"))
+CHANGE_SET_MAX_PER_CHAT = int(os.environ.get("CHANGE_SET_MAX_PER_CHAT", "20"))
+ADMIN_USER_IDS = {int(user_id) for user_id in os.environ.get("ADMIN_USER_IDS", "").split(",") if user_id.strip()}
+STATS_LOG_INTERVAL = float(os.environ.get("STATS_LOG_INTERVAL", "3600"))
+
+CHAT_HISTORY_LIMIT = 50
+STARTED_AT = time.perf_counter()
 
 client = None
+chat_archive = ChatArchive()
+llm_ready = asyncio.Event()
+prefetch_slots: Dict[Tuple[int, int], Dict] = {}
+
+async def warm_up_llm() -> bool:
+    try:
+        timings = await asyncio.to_thread(LLM.warm_up)
+        report = ", ".join(f"{module} {seconds:.2f}s" for module, seconds in timings.items())
+        logger.info(f"LLM import report: {report}")
+        return True
+    except Exception as e:
+        logger.error(f"LLM warm-up failed: {e}")
+        return False
+    finally:
+        llm_ready.set()
+        logger.info(f"LLM stack ready {time.perf_counter() - STARTED_AT:.2f}s after start")
+
+async def wait_for_llm() -> None:
+    if not llm_ready.is_set():
+        logger.info("Waiting for LLM warm-up to finish...")
+        await llm_ready.wait()
+
+def collect_stats() -> Dict:
+    return {
+        'jira_cache': LLM.get_cache_stats(),
+        'routing': LLM.get_routing_stats(),
+        'usage': LLM.get_usage_stats()
+    }
+
+async def log_stats_periodically() -> None:
+    await wait_for_llm()
+    while True:
+        await asyncio.sleep(STATS_LOG_INTERVAL)
+        stats = collect_stats()
+        logger.info(f"Jira cache stats: {stats['jira_cache']}")
+        logger.info(f"Routing stats: {stats['routing']}")
+        logger.info(f"Usage stats for {len(stats['usage'])} users and chats: {stats['usage']}")
+
+def get_sender_name(sender) -> str:
+    if not sender:
+        return "Unknown"
+    return getattr(sender, 'username', None) or getattr(sender, 'first_name', None) or getattr(sender, 'title', None) or "Unknown"
+
+def archive_message(chat_id: int, message, sender) -> None:
+    if not message.text:
+        return
+    sender_id = message.from_id.user_id if message.from_id and hasattr(message.from_id, 'user_id') else None
+    date = message.date.timestamp() if message.date else None
+    chat_archive.append(chat_id, message.id, sender_id, get_sender_name(sender), message.text, date)
+
+async def on_archived_message(event) -> None:
+    try:
+        archive_message(event.chat_id, event.message, await event.get_sender())
+    except Exception as e:
+        logger.error(f"Error archiving message {event.message.id} in chat {event.chat_id}: {e}")
 
 async def create_telethon_client():
     global client
     client = TelegramClient(StringSession(SESSION_STRING), API_ID, API_HASH)
     await client.start(bot_token=TOKEN)
     logger.info("Telethon client started successfully")
+    
+    chat_archive.load()
+    client.add_event_handler(on_archived_message, events.NewMessage())
+    client.add_event_handler(on_archived_message, events.MessageEdited())
+    logger.info("Subscribed to new and edited messages for local chat archive")
     return client
 
 def get_user_info(update: Update) -> Tuple[int, str, str]:
@@ -46,37 +122,129 @@ def is_user_authenticated(telegram_user_id: int) -> bool:
         logger.error(f"Error checking auth status: {e}")
         return False
 
-async def check_auth_and_reply(update: Update, user_id: int, user_name: str, user_lang: str) -> bool:
-    if not is_user_authenticated(user_id):
+async def check_auth_and_reply(update: Update, user_id: int, user_name: str, user_lang: str,
+                               authenticated: Optional[bool] = None) -> bool:
+    if authenticated is None:
+        authenticated = is_user_authenticated(user_id)
+    if not authenticated:
         reply_method = update.message.reply_text if hasattr(update, 'message') else update.callback_query.edit_message_text
         message_key = "auth_required" if hasattr(update, 'message') else "auth_required_short"
         await reply_method(get_message(message_key, user_lang, user_name=user_name))
         return False
     return True
 
+async def sync_chat_archive(chat_id: int) -> None:
+    logger.info(f"Chat {chat_id} is not synced yet, backfilling last {CHAT_HISTORY_LIMIT} messages from Telegram")
+    async for message in client.iter_messages(chat_id, limit=CHAT_HISTORY_LIMIT):
+        archive_message(chat_id, message, message.sender)
+    chat_archive.mark_synced(chat_id)
+
 async def get_chat_messages(update: Update, context: ContextTypes.DEFAULT_TYPE, user_lang: str) -> str:
     global client
+    chat_id = update.effective_chat.id
     
-    if client is None or not client.is_connected():
-        logger.error("Telethon client is not connected")
-        return get_message("telethon_not_connected", user_lang)
-    
-    messages = []
     try:
-        logger.info("Getting last 50 messages from chat")
-        async for message in client.iter_messages(update.effective_chat.id, limit=50):
-            if message.from_id and hasattr(message.from_id, 'user_id') and message.from_id.user_id == context.bot.id:
-                continue
-            if message.text:
-                sender = message.sender.username or message.sender.first_name if message.sender else "Unknown"
-                messages.append(f"{sender}: {message.text}")
+        if not chat_archive.is_synced(chat_id):
+            if client is None or not client.is_connected():
+                logger.error("Telethon client is not connected")
+                return get_message("telethon_not_connected", user_lang)
+            await sync_chat_archive(chat_id)
+        
+        records = chat_archive.get_messages(chat_id, limit=CHAT_HISTORY_LIMIT, exclude_sender_id=context.bot.id)
+        messages = [f"{record['sender']}: {record['text']}" for record in reversed(records)]
         
-        logger.info(f"Retrieved {len(messages)} messages from chat history")
+        logger.info(f"Retrieved {len(messages)} messages from local chat archive")
         return "\n".join(messages) if messages else get_message("no_messages_found", user_lang)
     except Exception as e:
         logger.error(f"Error retrieving messages: {e}")
         return get_message("error_retrieving_messages", user_lang, error=str(e))
 
+def drop_prefetch_tasks(slot: Optional[Dict]) -> None:
+    if slot:
+        slot['timer'].cancel()
+        for task in slot['tasks'].values():
+            task.cancel()
+
+def drop_prefetch_slot(key: Tuple[int, int]) -> None:
+    if slot := prefetch_slots.pop(key, None):
+        drop_prefetch_tasks(slot)
+        logger.info(f"Dropped prefetch for chat {key[0]}, user {key[1]}")
+
+def take_prefetch_slot(key: Tuple[int, int]) -> Optional[Dict]:
+    if slot := prefetch_slots.pop(key, None):
+        slot['timer'].cancel()
+    return slot
+
+async def prefetch_credentials(user_id: int) -> Optional[Dict]:
+    await wait_for_llm()
+    return await asyncio.to_thread(LLM.get_user_jira_credentials, str(user_id))
+
+async def prefetch_issues(credentials_task: asyncio.Task) -> Optional[Dict]:
+    if not (credentials := await credentials_task):
+        return None
+    return await asyncio.to_thread(LLM.fetch_project_issues, credentials)
+
+def start_prefetch(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, user_lang: str) -> None:
+    key = (update.effective_chat.id, user_id)
+    drop_prefetch_slot(key)
+    
+    tasks = {
+        'messages': asyncio.create_task(get_chat_messages(update, context, user_lang)),
+        'credentials': asyncio.create_task(prefetch_credentials(user_id))
+    }
+    if PREFETCH_JIRA_SNAPSHOT:
+        tasks['issues'] = asyncio.create_task(prefetch_issues(tasks['credentials']))
+    
+    timer = asyncio.get_running_loop().call_later(PREFETCH_TTL_SECONDS, drop_prefetch_slot, key)
+    prefetch_slots[key] = {'authenticated': True, 'tasks': tasks, 'timer': timer}
+    logger.info(f"Started prefetch for chat {key[0]}, user {user_id}: {', '.join(tasks)}")
+
+async def get_prefetched(slot: Optional[Dict], name: str):
+    if not slot or name not in slot['tasks']:
+        return None
+    task = slot['tasks'][name]
+    await asyncio.wait([task])
+    if task.cancelled():
+        logger.warning(f"Prefetched {name} was cancelled")
+        return None
+    if error := task.exception():
+        logger.warning(f"Prefetched {name} not available: {error!r}")
+        return None
+    return task.result()
+
+def is_change_set_expired(change_set: Dict) -> bool:
+    return time.time() - change_set['created_at'] > CHANGE_SET_TTL_SECONDS
+
+def prune_change_sets(change_sets: Dict[str, Dict]) -> None:
+    for change_set_id in [key for key, change_set in change_sets.items() if is_change_set_expired(change_set)]:
+        del change_sets[change_set_id]
+    by_age = sorted(change_sets, key=lambda key: change_sets[key]['created_at'])
+    for change_set_id in by_age[:max(len(by_age) - CHANGE_SET_MAX_PER_CHAT, 0)]:
+        del change_sets[change_set_id]
+
+def build_apply_markup(context: ContextTypes.DEFAULT_TYPE, brief: dict, user_id: int, user_lang: str) -> Optional[InlineKeyboardMarkup]:
+    if not (changes := LLM.build_change_set(brief['agreements'])):
+        return None
+    
+    change_set_id = uuid.uuid4().hex[:12]
+    change_sets = context.chat_data.setdefault('change_sets', {})
+    change_sets[change_set_id] = {'user_id': user_id, 'changes': changes, 'created_at': time.time(), 'applying': False}
+    prune_change_sets(change_sets)
+    keyboard = [[InlineKeyboardButton(get_message("apply_button", user_lang, count=len(changes)),
+                                      callback_data=f"apply_{change_set_id}")]]
+    return InlineKeyboardMarkup(keyboard)
+
+async def reply_with_brief(reply_method, send_method, context: ContextTypes.DEFAULT_TYPE, response, success: bool,
+                           user_id: int, user_lang: str) -> None:
+    if not success:
+        await reply_method(render_text(str(response)), parse_mode='HTML')
+        return
+    chunks = render_brief(response, user_lang)
+    markup = build_apply_markup(context, response, user_id, user_lang)
+    for index, chunk in enumerate(chunks):
+        method = reply_method if index == 0 else send_method
+        await method(chunk, parse_mode='HTML', reply_markup=markup if index == len(chunks) - 1 else None)
+
 async def auth_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id, user_name, user_lang = get_user_info(update)
     
@@ -106,14 +274,30 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     message_key = "status_authorized" if is_user_authenticated(user_id) else "status_not_authorized"
     await update.message.reply_text(get_message(message_key, user_lang, user_name=user_name))
 
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id, user_name, user_lang = get_user_info(update)
+    if user_id not in ADMIN_USER_IDS:
+        await update.message.reply_text(get_message("stats_not_allowed", user_lang))
+        return
+    
+    await wait_for_llm()
+    text = html.escape(json.dumps(collect_stats(), indent=2, ensure_ascii=False), quote=False)
+    limit = TELEGRAM_MESSAGE_LIMIT - len("<pre></pre>")
+    if len(text) > limit:
+        text = text[:text.rfind("\n", 0, limit)]
+    await update.message.reply_text(f"<pre>{text}</pre>", parse_mode='HTML')
+
 async def brief_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id, user_name, user_lang = get_user_info(update)
     
     if not await check_auth_and_reply(update, user_id, user_name, user_lang):
         return
     
+    start_prefetch(update, context, user_id, user_lang)
+    
+    await wait_for_llm()
     keyboard = [[InlineKeyboardButton(name, callback_data=model_id)] 
-                for model_id, name in get_available_models().items()]
+                for model_id, name in LLM.get_available_models().items()]
     await update.message.reply_text(
         get_message("select_model", user_lang),
         reply_markup=InlineKeyboardMarkup(keyboard)
@@ -132,31 +316,88 @@ async def test_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             test_chat_history = f.read().strip()
     
     await update.message.reply_text(get_message("processing_openai", user_lang))
-    response, success = await handle_llm_command(test_chat_history, 'model_openai', str(user_id))
-    await update.message.reply_text(response, parse_mode='HTML')
+    await wait_for_llm()
+    response, success = await LLM.handle_llm_command(test_chat_history, 'model_openai', str(user_id), str(update.effective_chat.id))
+    await reply_with_brief(update.message.reply_text, update.message.reply_text, context, response, success, user_id, user_lang)
 
 async def brief_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     await query.answer()
     
     user_id, user_name, user_lang = get_user_info(update)
+    slot = take_prefetch_slot((update.effective_chat.id, user_id))
     
-    if not await check_auth_and_reply(update, user_id, user_name, user_lang):
+    if not await check_auth_and_reply(update, user_id, user_name, user_lang, slot['authenticated'] if slot else None):
+        drop_prefetch_tasks(slot)
         return
     
     await query.edit_message_text(get_message("processing_with_model", user_lang, model=query.data))
     await query.edit_message_text(get_message("getting_messages", user_lang))
     
-    messages = await get_chat_messages(update, context, user_lang)
+    messages = await get_prefetched(slot, 'messages') or await get_chat_messages(update, context, user_lang)
     if messages == get_message("no_messages_found", user_lang):
+        drop_prefetch_tasks(slot)
         await query.edit_message_text(messages)
         return
     
-    response, success = await handle_llm_command(messages, query.data, str(user_id))
-    await query.edit_message_text(response, parse_mode='HTML')
+    await wait_for_llm()
+    credentials = await get_prefetched(slot, 'credentials')
+    issues = await get_prefetched(slot, 'issues')
+    response, success = await LLM.handle_llm_command(
+        messages, query.data, str(user_id), str(update.effective_chat.id),
+        credentials=credentials, issues=issues
+    )
+    await reply_with_brief(query.edit_message_text, query.message.reply_text, context, response, success, user_id, user_lang)
+
+async def apply_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    user_id, user_name, user_lang = get_user_info(update)
+    
+    change_set_id = query.data[len("apply_"):]
+    change_sets = context.chat_data.get('change_sets', {})
+    if not (change_set := change_sets.get(change_set_id)) or is_change_set_expired(change_set):
+        change_sets.pop(change_set_id, None)
+        await query.answer(get_message("change_set_expired", user_lang), show_alert=True)
+        await query.edit_message_reply_markup(reply_markup=None)
+        return
+    if change_set['user_id'] != user_id:
+        await query.answer(get_message("change_set_not_owner", user_lang), show_alert=True)
+        return
+    if change_set['applying']:
+        await query.answer(get_message("applying_changes", user_lang), show_alert=True)
+        return
+    
+    await query.answer()
+    change_set['applying'] = True
+    progress = await query.message.reply_text(get_message("applying_changes", user_lang))
+    try:
+        await wait_for_llm()
+        if not (credentials := await asyncio.to_thread(LLM.get_user_jira_credentials, str(user_id))):
+            await progress.edit_text(get_message("auth_required_short", user_lang))
+            return
+        
+        result = await LLM.apply_change_set(credentials, change_set['changes'])
+        change_sets.pop(change_set_id, None)
+    finally:
+        change_set['applying'] = False
+    
+    await query.edit_message_reply_markup(reply_markup=None)
+    text = get_message(
+        "changes_applied", user_lang,
+        transitioned=", ".join(result['transitioned']) or "—",
+        commented=", ".join(result['commented']) or "—"
+    )
+    if result['failed']:
+        failed = "\n".join(f"{item['issue_key']}: {item['error']}" for item in result['failed'])
+        text += "\n\n" + get_message("changes_failed", user_lang, failed=failed)
+    await progress.edit_text(text)
 
 async def main() -> None:
     try:
+        warm_up_task = asyncio.create_task(warm_up_llm())
+        if STATS_LOG_INTERVAL > 0:
+            asyncio.create_task(log_stats_periodically())
+        
         logger.info("Creating and starting Telethon client...")
         await create_telethon_client()
         
@@ -166,12 +407,21 @@ async def main() -> None:
         application.add_handler(CommandHandler("status", status_command))
         application.add_handler(CommandHandler("brief", brief_command))
         application.add_handler(CommandHandler("test", test_command))
+        application.add_handler(CommandHandler("stats", stats_command))
         application.add_handler(CallbackQueryHandler(brief_callback, pattern="^model_"))
+        application.add_handler(CallbackQueryHandler(apply_callback, pattern="^apply_"))
         
         logger.info("Starting Telegram bot application...")
         await application.initialize()
         await application.start()
         await application.updater.start_polling()
+        logger.info(f"Bot is answering commands {time.perf_counter() - STARTED_AT:.2f}s after start")
+        
+        if not await warm_up_task:
+            logger.error("LLM stack failed to load, not reporting the bot as ready")
+        elif BOT_READY_FILE:
+            with open(BOT_READY_FILE, "w") as f:
+                f.write(str(time.time()))
         
         logger.info("Bot is running. Press Ctrl+C to stop.")
         while True:
@@ -0,0 +1,68 @@
+import html
+from typing import Dict, List, Optional
+
+from messages import get_message
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+ELLIPSIS = "…"
+
+
+def render_issue_link(issue_key: str, jira_url: Optional[str]) -> str:
+    if not jira_url:
+        return html.escape(issue_key)
+    url = f"{jira_url.rstrip('/')}/browse/{issue_key}"
+    return f'<a href="{html.escape(url, quote=True)}">{html.escape(issue_key)}</a>'
+
+
+def render_agreement(agreement: Dict, jira_url: Optional[str], lang: str) -> str:
+    lines = [get_message("brief_task", lang, task=html.escape(agreement['task']))]
+    if agreement.get('new_status'):
+        lines.append(get_message("brief_state_change", lang, status=html.escape(agreement['new_status'])))
+    else:
+        lines.append(get_message("brief_state_not_needed", lang))
+    if agreement.get('comment'):
+        lines.append(get_message("brief_comment", lang, comment=html.escape(agreement['comment'])))
+    if agreement.get('issue_key'):
+        lines.append(get_message("brief_link", lang, link=render_issue_link(agreement['issue_key'], jira_url)))
+    return "\n".join(lines)
+
+
+def shorten(text: str, length: int) -> str:
+    return text if len(text) <= length else text[:max(length - len(ELLIPSIS), 0)] + ELLIPSIS
+
+
+def render_fitted_agreement(agreement: Dict, jira_url: Optional[str], lang: str, limit: int) -> str:
+    agreement = dict(agreement)
+    while len(rendered := render_agreement(agreement, jira_url, lang)) > limit:
+        field = max(('task', 'comment'), key=lambda name: len(agreement.get(name) or ""))
+        if len(agreement.get(field) or "") <= len(ELLIPSIS):
+            return shorten(html.escape(agreement['task']), limit)
+        agreement[field] = shorten(agreement[field], len(agreement[field]) - (len(rendered) - limit))
+    return rendered
+
+
+def render_text(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> str:
+    escaped = html.escape(text)
+    if len(escaped) <= limit:
+        return escaped
+    parts, length = [], len(ELLIPSIS)
+    for char in text:
+        if length + len(part := html.escape(char)) > limit:
+            break
+        parts.append(part)
+        length += len(part)
+    return "".join(parts) + ELLIPSIS
+
+
+def render_brief(brief: Dict, lang: str = "en", limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    if not brief.get('agreements'):
+        return [get_message("brief_no_agreements", lang)]
+
+    chunks = [get_message("brief_header", lang)]
+    for agreement in brief['agreements']:
+        section = render_fitted_agreement(agreement, brief.get('jira_url'), lang, limit)
+        if len(chunks[-1]) + len("\n\n") + len(section) <= limit:
+            chunks[-1] += "\n\n" + section
+        else:
+            chunks.append(section)
+    return chunks
@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+CHAT_ARCHIVE_DIR = os.environ.get("CHAT_ARCHIVE_DIR", "chat_archive")
+CHAT_ARCHIVE_MAX_MESSAGES = int(os.environ.get("CHAT_ARCHIVE_MAX_MESSAGES", "500"))
+CHAT_ARCHIVE_MAX_AGE_DAYS = float(os.environ.get("CHAT_ARCHIVE_MAX_AGE_DAYS", "14"))
+
+
+class ChatArchive:
+
+    def __init__(self, directory: str = CHAT_ARCHIVE_DIR, max_messages: int = CHAT_ARCHIVE_MAX_MESSAGES,
+                 max_age_days: float = CHAT_ARCHIVE_MAX_AGE_DAYS):
+        self.directory = directory
+        self.max_messages = max_messages
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self._chats: Dict[int, Dict[int, Dict]] = {}
+        self._log_records: Dict[int, int] = {}
+        self._synced_chats: Set[int] = set()
+
+    def _path(self, chat_id: int) -> str:
+        return os.path.join(self.directory, f"{chat_id}.jsonl")
+
+    def load(self) -> None:
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+            return
+
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".jsonl"):
+                continue
+            try:
+                chat_id = int(filename[:-len(".jsonl")])
+            except ValueError:
+                continue
+
+            chat = self._chats.setdefault(chat_id, {})
+            records = 0
+            try:
+                with open(self._path(chat_id), "r", encoding="utf-8") as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            logger.warning(f"Skipping corrupted archive record in {filename}")
+                            continue
+                        chat[record['id']] = record
+                        records += 1
+            except Exception as e:
+                logger.error(f"Error loading chat archive {filename}: {e}")
+            self._log_records[chat_id] = records
+            self._enforce_retention(chat_id)
+
+        logger.info(f"Loaded chat archive: {len(self._chats)} chats, "
+                    f"{sum(len(c) for c in self._chats.values())} messages")
+
+    def append(self, chat_id: int, message_id: int, sender_id: Optional[int], sender: str,
+               text: str, date: Optional[float] = None) -> None:
+        record = {
+            'id': message_id,
+            'sender_id': sender_id,
+            'sender': sender,
+            'text': text,
+            'date': date if date is not None else time.time()
+        }
+        self._chats.setdefault(chat_id, {})[message_id] = record
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path(chat_id), "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n")
+            self._log_records[chat_id] = self._log_records.get(chat_id, 0) + 1
+        except Exception as e:
+            logger.error(f"Error writing chat archive for chat {chat_id}: {e}")
+
+        self._enforce_retention(chat_id)
+
+    def _enforce_retention(self, chat_id: int) -> None:
+        chat = self._chats.get(chat_id)
+        if not chat:
+            return
+
+        min_date = time.time() - self.max_age_seconds
+        expired = [message_id for message_id, record in chat.items() if record['date'] < min_date]
+        overflow = len(chat) - len(expired) - self.max_messages
+        if overflow > 0:
+            alive = sorted(message_id for message_id, record in chat.items() if record['date'] >= min_date)
+            expired.extend(alive[:overflow])
+        for message_id in expired:
+            del chat[message_id]
+
+        if self._log_records.get(chat_id, 0) > 2 * max(len(chat), 1):
+            self._compact(chat_id)
+
+    def _compact(self, chat_id: int) -> None:
+        chat = self._chats.get(chat_id, {})
+        path = self._path(chat_id)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for message_id in sorted(chat):
+                    f.write(json.dumps(chat[message_id], ensure_ascii=False, separators=(',', ':')) + "\n")
+            os.replace(tmp_path, path)
+            self._log_records[chat_id] = len(chat)
+            logger.debug(f"Compacted chat archive for chat {chat_id}: {len(chat)} messages")
+        except Exception as e:
+            logger.error(f"Error compacting chat archive for chat {chat_id}: {e}")
+
+    def is_synced(self, chat_id: int) -> bool:
+        return chat_id in self._synced_chats
+
+    def mark_synced(self, chat_id: int) -> None:
+        self._synced_chats.add(chat_id)
+
+    def get_messages(self, chat_id: int, limit: int = 50, exclude_sender_id: Optional[int] = None) -> List[Dict]:
+        chat = self._chats.get(chat_id, {})
+        messages = []
+        for message_id in sorted(chat, reverse=True):
+            record = chat[message_id]
+            if exclude_sender_id is not None and record['sender_id'] == exclude_sender_id:
+                continue
+            messages.append(record)
+            if len(messages) >= limit:
+                break
+        return messages
@@ -0,0 +1,72 @@
+import argparse
+import json
+import logging
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+TRIAGE_MODEL = os.environ.get("TRIAGE_MODEL", "gpt-4o-mini")
+FAKE_TRIAGE_RESPONSE = os.environ.get("FAKE_TRIAGE_RESPONSE", '{"has_agreements": true, "issues": []}')
+FAKE_LLM_RESPONSE = os.environ.get("FAKE_LLM_RESPONSE", '{"agreements": []}')
+FAKE_LLM_DELAY = float(os.environ.get("FAKE_LLM_DELAY", "0"))
+
+
+def build_completion(model: str, content: str, prompt_chars: int) -> dict:
+    return {
+        'id': f"chatcmpl-fake-{time.time_ns()}",
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': content},
+            'finish_reason': 'stop'
+        }],
+        'usage': {
+            'prompt_tokens': prompt_chars // 4,
+            'completion_tokens': len(content) // 4,
+            'total_tokens': (prompt_chars + len(content)) // 4
+        }
+    }
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_error(404)
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        model = body.get('model', '')
+        prompt_chars = sum(len(str(message.get('content') or '')) for message in body.get('messages', []))
+        content = FAKE_TRIAGE_RESPONSE if model == TRIAGE_MODEL else FAKE_LLM_RESPONSE
+        logger.info(f"Fake completion for {model}: {prompt_chars} prompt characters")
+
+        if FAKE_LLM_DELAY:
+            time.sleep(FAKE_LLM_DELAY)
+
+        payload = json.dumps(build_completion(model, content, prompt_chars)).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible fake model server for routing tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    logger.info(f"Fake model server listening on http://{args.host}:{args.port}/v1 (triage model: {TRIAGE_MODEL})")
+    ThreadingHTTPServer((args.host, args.port), FakeOpenAIHandler).serve_forever()
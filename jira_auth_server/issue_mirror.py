@@ -0,0 +1,231 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MIRROR_DIR = os.environ.get("ISSUE_MIRROR_DIR", "issue_mirror")
+MIRROR_SAVE_DELAY = float(os.environ.get("MIRROR_SAVE_DELAY", "5"))
+MIRROR_FIELDS = [
+    'summary', 'status', 'assignee', 'reporter', 'priority', 'issuetype', 'created', 'updated', 'project', 'security'
+]
+
+
+def trim_issue(issue: Dict) -> Dict:
+    fields = issue.get('fields', {}) or {}
+    return {
+        'id': issue.get('id'),
+        'key': issue['key'],
+        'fields': {name: fields.get(name) for name in MIRROR_FIELDS if name in fields}
+    }
+
+
+def get_updated_at(issue: Dict) -> Optional[datetime]:
+    if not (updated := (issue.get('fields') or {}).get('updated')):
+        return None
+    for parse in (lambda value: datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f%z"), datetime.fromisoformat):
+        try:
+            return parse(updated)
+        except ValueError:
+            continue
+    return None
+
+
+def is_newer(issue: Dict, stored: Optional[Dict]) -> bool:
+    if stored is None:
+        return True
+    if (updated_at := get_updated_at(issue)) is None or (stored_at := get_updated_at(stored)) is None:
+        return True
+    return updated_at >= stored_at
+
+
+def get_project_key(issue: Dict) -> str:
+    project = (issue.get('fields') or {}).get('project') or {}
+    return project.get('key') or issue['key'].split('-')[0]
+
+
+class IssueMirror:
+
+    def __init__(self, directory: str = MIRROR_DIR, save_delay: float = MIRROR_SAVE_DELAY):
+        self.directory = directory
+        self.save_delay = save_delay
+        self._clouds: Dict[str, Dict] = {}
+        self._mtimes: Dict[str, Optional[float]] = {}
+        self._pending: Dict[str, List[Tuple[str, Any]]] = {}
+        self._timers: Dict[str, threading.Timer] = {}
+        self._lock = threading.RLock()
+
+    def _path(self, cloud_id: str) -> str:
+        return os.path.join(self.directory, f"{cloud_id}.json")
+
+    @contextmanager
+    def _file_lock(self, cloud_id: str):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(f"{self._path(cloud_id)}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _read(self, cloud_id: str) -> Tuple[Dict, Optional[float]]:
+        path = self._path(cloud_id)
+        data = {'issues': {}, 'reconciled_at': None}
+        if not os.path.exists(path):
+            return data, None
+        mtime = os.path.getmtime(path)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading issue mirror for cloud {cloud_id}: {e}")
+        return data, mtime
+
+    @staticmethod
+    def _apply(data: Dict, operation: Tuple[str, Any]) -> bool:
+        kind, payload = operation
+        if kind == 'upsert':
+            if not is_newer(payload, data['issues'].get(payload['key'])):
+                return False
+            data['issues'][payload['key']] = payload
+            return True
+        if kind == 'delete':
+            return data['issues'].pop(payload, None) is not None
+        data['reconciled_at'] = payload
+        return True
+
+    def _load(self, cloud_id: str) -> Dict:
+        path = self._path(cloud_id)
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        if cloud_id in self._clouds and mtime == self._mtimes.get(cloud_id):
+            return self._clouds[cloud_id]
+
+        data, mtime = self._read(cloud_id)
+        for operation in self._pending.get(cloud_id, []):
+            self._apply(data, operation)
+        self._clouds[cloud_id] = data
+        self._mtimes[cloud_id] = mtime
+        return data
+
+    def _record(self, cloud_id: str, operations: List[Tuple[str, Any]]) -> None:
+        data = self._load(cloud_id)
+        for operation in operations:
+            self._apply(data, operation)
+        self._pending.setdefault(cloud_id, []).extend(operations)
+        if self.save_delay <= 0:
+            self.flush(cloud_id)
+        elif cloud_id not in self._timers:
+            timer = self._timers[cloud_id] = threading.Timer(self.save_delay, self.flush, args=(cloud_id,))
+            timer.daemon = True
+            timer.start()
+
+    def flush(self, cloud_id: str) -> None:
+        with self._lock:
+            if (timer := self._timers.pop(cloud_id, None)) is not None:
+                timer.cancel()
+            if not (operations := self._pending.pop(cloud_id, None)):
+                return
+            path = self._path(cloud_id)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                with self._file_lock(cloud_id):
+                    data, _ = self._read(cloud_id)
+                    for operation in operations:
+                        self._apply(data, operation)
+                    with open(tmp_path, "w") as f:
+                        json.dump(data, f)
+                    os.replace(tmp_path, path)
+                    self._clouds[cloud_id] = data
+                    self._mtimes[cloud_id] = os.path.getmtime(path)
+            except Exception as e:
+                logger.error(f"Error saving issue mirror for cloud {cloud_id}: {e}")
+
+    def flush_all(self) -> None:
+        with self._lock:
+            for cloud_id in list(self._pending):
+                self.flush(cloud_id)
+
+    def cloud_ids(self) -> List[str]:
+        with self._lock:
+            known = set(self._clouds)
+            if os.path.isdir(self.directory):
+                known.update(name[:-len(".json")] for name in os.listdir(self.directory) if name.endswith(".json"))
+            return sorted(known)
+
+    def upsert(self, cloud_id: str, issue: Dict) -> bool:
+        with self._lock:
+            if not is_newer(issue, self._load(cloud_id)['issues'].get(issue['key'])):
+                logger.info(f"Ignored stale update of {issue['key']} for issue mirror of cloud {cloud_id}")
+                return False
+            self._record(cloud_id, [('upsert', trim_issue(issue))])
+            return True
+
+    def delete(self, cloud_id: str, issue_key: str) -> bool:
+        with self._lock:
+            if issue_key not in self._load(cloud_id)['issues']:
+                return False
+            self._record(cloud_id, [('delete', issue_key)])
+            return True
+
+    def apply_event(self, cloud_id: str, event: Dict) -> bool:
+        event_type = event.get('webhookEvent', '')
+        if not (issue := event.get('issue')) or not issue.get('key'):
+            return False
+
+        if event_type == 'jira:issue_deleted':
+            applied = self.delete(cloud_id, issue['key'])
+        elif event_type in ('jira:issue_created', 'jira:issue_updated'):
+            applied = self.upsert(cloud_id, issue)
+        else:
+            return False
+        if not applied:
+            return False
+        logger.info(f"Applied {event_type} for {issue['key']} to issue mirror of cloud {cloud_id}")
+        return True
+
+    def reconcile(self, cloud_id: str, issues: Iterable[Dict], full_projects: Optional[List[str]] = None) -> None:
+        with self._lock:
+            data = self._load(cloud_id)
+            fetched = {issue['key']: trim_issue(issue) for issue in issues}
+            stale = [key for key, issue in fetched.items() if not is_newer(issue, data['issues'].get(key))]
+            removed = []
+            if full_projects is not None:
+                projects = {key.lower() for key in full_projects}
+                removed = [
+                    key for key, issue in data['issues'].items()
+                    if get_project_key(issue).lower() in projects and key not in fetched
+                ]
+                logger.info(
+                    f"Full reconciliation of cloud {cloud_id}: {len(fetched)} issues, {len(removed)} removed, "
+                    f"{len(stale)} stale skipped"
+                )
+            else:
+                logger.info(
+                    f"Incremental reconciliation of cloud {cloud_id}: {len(fetched)} issues updated, "
+                    f"{len(stale)} stale skipped"
+                )
+            operations = [('delete', key) for key in removed]
+            operations.extend(('upsert', issue) for key, issue in fetched.items() if key not in stale)
+            operations.append(('reconciled', datetime.now(timezone.utc).isoformat()))
+            self._record(cloud_id, operations)
+
+    def project_keys(self, cloud_id: str) -> List[str]:
+        with self._lock:
+            return sorted({get_project_key(issue) for issue in self._load(cloud_id)['issues'].values()})
+
+    def get_issues(self, cloud_id: str, project_key: Optional[str] = None) -> Dict:
+        with self._lock:
+            data = self._load(cloud_id)
+            issues = [
+                issue for issue in data['issues'].values()
+                if project_key is None or get_project_key(issue).lower() == project_key.lower()
+            ]
+            public = [issue for issue in issues if not issue['fields'].get('security')]
+            return {
+                'issues': public,
+                'total': len(public),
+                'restricted': len(issues) - len(public),
+                'reconciled_at': data['reconciled_at']
+            }
@@ -1,16 +1,24 @@
+import atexit
+import fcntl
+import hashlib
 import hmac
 import json
 import logging
 import os
 import sys
+import threading
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Optional
+from typing import Dict, List, Optional
+from urllib.parse import quote
 
 import requests
 from cryptography.fernet import Fernet
 from dotenv import load_dotenv
 from flask import Flask, request, jsonify
 
+from issue_mirror import MIRROR_FIELDS, IssueMirror
+
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
 )
@@ -26,9 +34,23 @@ JIRA_REDIRECT_URI = os.environ.get("JIRA_REDIRECT_URI", "https://www.briefchief.
 JIRA_BASE_URL = os.environ.get("JIRA_BASE_URL", "https://auth.atlassian.com")
 ENCRYPTION_KEY = os.environ.get("ENCRYPTION_KEY", Fernet.generate_key().decode())
 API_KEY = os.environ.get("INTERNAL_API_KEY", "")
+JIRA_OAUTH_SCOPES = os.environ.get("JIRA_OAUTH_SCOPES", "read:jira-work read:jira-user")
+JIRA_WEBHOOK_SECRETS = dict(
+    entry.strip().split("=", 1) for entry in os.environ.get("JIRA_WEBHOOK_SECRETS", "").split(",") if "=" in entry
+)
+MIRROR_RECONCILE_INTERVAL = int(os.environ.get("MIRROR_RECONCILE_INTERVAL", "300"))
+MIRROR_FULL_RECONCILE_EVERY = int(os.environ.get("MIRROR_FULL_RECONCILE_EVERY", "12"))
+MIRROR_PERMISSION_TTL = int(os.environ.get("MIRROR_PERMISSION_TTL", "300"))
 TOKENS_FILE = "user_tokens.json"
 
 fernet = Fernet(ENCRYPTION_KEY.encode())
+issue_mirror = IssueMirror()
+atexit.register(issue_mirror.flush_all)
+reconciler_started = False
+reconciler_lock = threading.Lock()
+reconciler_lock_file = None
+browse_permissions: Dict[tuple, tuple] = {}
+browse_permissions_lock = threading.Lock()
 
 def load_user_tokens() -> Dict[str, Dict]:
     if os.path.exists(TOKENS_FILE):
@@ -64,6 +86,15 @@ def verify_api_key(request) -> bool:
     
     return hmac.compare_digest(auth_header[7:], API_KEY)
 
+def verify_webhook_signature(request, cloud_id: str) -> bool:
+    if not (secret := JIRA_WEBHOOK_SECRETS.get(cloud_id)):
+        logger.error(f"No webhook secret configured for cloud {cloud_id} in JIRA_WEBHOOK_SECRETS!")
+        return False
+    
+    signature = request.headers.get('X-Hub-Signature', '')
+    expected = 'sha256=' + hmac.new(secret.encode(), request.get_data(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature, expected)
+
 def parse_expires_at(token_data: Dict) -> Optional[datetime]:
     if not token_data.get('expires_at'):
         return None
@@ -168,6 +199,117 @@ def get_jira_user_info(access_token: str) -> Dict:
         logger.error(f"Error getting Jira user info: {e}")
     return {}
 
+def get_cloud_access_token(cloud_id: str) -> Optional[str]:
+    for user_id, token_data in load_user_tokens().items():
+        if token_data.get('jira_cloud_id') != cloud_id:
+            continue
+        token_data = refresh_token_if_needed(user_id, token_data) or token_data
+        if is_token_valid(token_data):
+            return decrypt_token(token_data['access_token'])
+    return None
+
+def get_account_access_token(cloud_id: str, account_id: str) -> Optional[str]:
+    for user_id, token_data in load_user_tokens().items():
+        if token_data.get('jira_cloud_id') != cloud_id or token_data.get('jira_account_id') != account_id:
+            continue
+        token_data = refresh_token_if_needed(user_id, token_data) or token_data
+        if is_token_valid(token_data):
+            return decrypt_token(token_data['access_token'])
+    return None
+
+def can_browse_project(cloud_id: str, account_id: str, access_token: str, project_key: str) -> bool:
+    cache_key = (cloud_id, account_id, project_key.lower())
+    with browse_permissions_lock:
+        if (cached := browse_permissions.get(cache_key)) and cached[0] > time.monotonic():
+            return cached[1]
+    
+    response = requests.get(
+        f'https://api.atlassian.com/ex/jira/{cloud_id}/rest/api/3/mypermissions',
+        params={'projectKey': project_key, 'permissions': 'BROWSE_PROJECTS'},
+        headers={'Authorization': f'Bearer {access_token}'},
+        timeout=10
+    )
+    if response.status_code in (400, 404):
+        allowed = False
+    else:
+        response.raise_for_status()
+        allowed = bool(response.json().get('permissions', {}).get('BROWSE_PROJECTS', {}).get('havePermission'))
+    
+    with browse_permissions_lock:
+        browse_permissions[cache_key] = (time.monotonic() + MIRROR_PERMISSION_TTL, allowed)
+    return allowed
+
+def fetch_issues(cloud_id: str, access_token: str, jql: str) -> List[Dict]:
+    issues = []
+    next_page_token = None
+    while True:
+        payload = {'jql': jql, 'maxResults': 100, 'fields': MIRROR_FIELDS}
+        if next_page_token:
+            payload['nextPageToken'] = next_page_token
+        response = requests.post(
+            f'https://api.atlassian.com/ex/jira/{cloud_id}/rest/api/3/search/jql',
+            json=payload,
+            headers={'Authorization': f'Bearer {access_token}', 'Content-Type': 'application/json'},
+            timeout=30
+        )
+        response.raise_for_status()
+        data = response.json()
+        issues.extend(data.get('issues', []) or [])
+        if data.get('isLast', True) or not (next_page_token := data.get('nextPageToken')):
+            return issues
+
+def reconcile_cloud(cloud_id: str, project_keys: List[str], full: bool, access_token: Optional[str] = None) -> None:
+    if not project_keys:
+        return
+    if not (access_token := access_token or get_cloud_access_token(cloud_id)):
+        logger.warning(f"No valid token for cloud {cloud_id}, skipping issue mirror reconciliation")
+        return
+    
+    jql = f"project in ({', '.join(json.dumps(key) for key in project_keys)})"
+    if not full:
+        jql += f" AND updated >= -{MIRROR_RECONCILE_INTERVAL // 60 + 5}m"
+    issue_mirror.reconcile(cloud_id, fetch_issues(cloud_id, access_token, jql), project_keys if full else None)
+
+def claim_reconciler() -> bool:
+    global reconciler_lock_file
+    if reconciler_lock_file is not None:
+        return True
+    os.makedirs(issue_mirror.directory, exist_ok=True)
+    lock_file = open(os.path.join(issue_mirror.directory, ".reconciler.lock"), "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return False
+    reconciler_lock_file = lock_file
+    logger.info(f"Worker {os.getpid()} is now reconciling the issue mirror")
+    return True
+
+def run_reconciler() -> None:
+    iteration = 0
+    while True:
+        time.sleep(MIRROR_RECONCILE_INTERVAL)
+        if not claim_reconciler():
+            continue
+        iteration += 1
+        full = iteration % MIRROR_FULL_RECONCILE_EVERY == 0
+        for cloud_id in issue_mirror.cloud_ids():
+            try:
+                reconcile_cloud(cloud_id, issue_mirror.project_keys(cloud_id), full)
+            except Exception as e:
+                logger.error(f"Error reconciling issue mirror for cloud {cloud_id}: {e}")
+
+@app.before_request
+def start_reconciler():
+    global reconciler_started
+    if reconciler_started or MIRROR_RECONCILE_INTERVAL <= 0:
+        return
+    with reconciler_lock:
+        if not reconciler_started:
+            threading.Thread(target=run_reconciler, name="issue-mirror-reconciler", daemon=True).start()
+            reconciler_started = True
+            logger.info(f"Issue mirror reconciliation started (every {MIRROR_RECONCILE_INTERVAL}s)")
+
 @app.route('/auth/start')
 def start_auth():
     if not (telegram_user_id := request.args.get('telegram_user_id')):
@@ -179,7 +321,7 @@ def start_auth():
         f"client_id={JIRA_CLIENT_ID}&"
         f"redirect_uri={JIRA_REDIRECT_URI}&"
         f"response_type=code&prompt=consent&"
-        f"scope=read:jira-work%20read:jira-user&"
+        f"scope={quote(JIRA_OAUTH_SCOPES, safe=':')}&"
         f"state={state}"
     )
     
@@ -297,6 +439,42 @@ def revoke_auth(telegram_user_id: str):
         return jsonify({'message': 'Authentication revoked successfully'})
     return jsonify({'message': 'User not authenticated'}), 404
 
+@app.route('/webhooks/jira/<cloud_id>', methods=['POST'])
+def jira_webhook(cloud_id: str):
+    if not verify_webhook_signature(request, cloud_id):
+        logger.warning(f"Rejected Jira webhook for cloud {cloud_id}: invalid signature")
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    applied = issue_mirror.apply_event(cloud_id, request.get_json(silent=True) or {})
+    return jsonify({'applied': applied})
+
+@app.route('/mirror/<cloud_id>/issues')
+def mirrored_issues(cloud_id: str):
+    if not verify_api_key(request):
+        logger.warning(f"Unauthorized issue mirror request for cloud {cloud_id}")
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    project_key = request.args.get('project')
+    account_id = request.args.get('account')
+    if not project_key or not account_id:
+        return jsonify({'error': 'project and account are required'}), 400
+    if not (access_token := get_account_access_token(cloud_id, account_id)):
+        return jsonify({'error': 'Account not authenticated for this cloud'}), 403
+    
+    try:
+        if not can_browse_project(cloud_id, account_id, access_token, project_key):
+            logger.warning(f"Account {account_id} cannot browse {project_key} in cloud {cloud_id}")
+            return jsonify({'error': 'Forbidden'}), 403
+        
+        result = issue_mirror.get_issues(cloud_id, project_key)
+        if not result['issues'] and not result['restricted']:
+            reconcile_cloud(cloud_id, [project_key], full=True, access_token=access_token)
+            result = issue_mirror.get_issues(cloud_id, project_key)
+    except Exception as e:
+        logger.error(f"Error serving issue mirror for {project_key} in cloud {cloud_id}: {e}")
+        return jsonify({'error': 'Issue mirror unavailable'}), 503
+    return jsonify(result)
+
 if __name__ == '__main__':
     if ENCRYPTION_KEY == Fernet.generate_key().decode():
         logger.warning("ENCRYPTION_KEY not set! Generated a new one. Set it as environment variable for production.")
@@ -21,6 +21,22 @@ MESSAGES = {
         "processing_with_model": "Обработка сообщений с помощью {model}...",
         "getting_messages": "Получение сообщений чата...",
         "processing_openai": "Обработка сообщений с помощью OpenAI...",
+        
+        "brief_header": "<b>Найденные договорённости по задачам:</b>",
+        "brief_no_agreements": "Договорённостей по задачам не найдено.",
+        "brief_task": "<b>Задача:</b> {task}",
+        "brief_state_change": "<b>Смена статуса:</b> Новый статус — {status}",
+        "brief_state_not_needed": "<b>Смена статуса:</b> Не требуется",
+        "brief_comment": "<b>Комментарий:</b> {comment}",
+        "brief_link": "<b>Ссылка на задачу:</b> {link}",
+        
+        "apply_button": "✅ Применить изменения в Jira ({count})",
+        "applying_changes": "Применение изменений в Jira...",
+        "change_set_expired": "❌ Эти изменения больше недоступны. Запустите /brief ещё раз.",
+        "change_set_not_owner": "❌ Применить изменения может только пользователь, запросивший сводку.",
+        "changes_applied": "✅ Изменения применены.\nСмена статуса: {transitioned}\nКомментарии: {commented}",
+        "changes_failed": "❌ Не удалось применить:\n{failed}",
+        "stats_not_allowed": "❌ Команда /stats доступна только администраторам бота.",
     },
     
     "en": {
@@ -45,6 +61,22 @@ MESSAGES = {
         "processing_with_model": "Processing messages with {model}...",
         "getting_messages": "Getting chat messages...",
         "processing_openai": "Processing messages using OpenAI...",
+        
+        "brief_header": "<b>Task Agreements Found:</b>",
+        "brief_no_agreements": "No task agreements found.",
+        "brief_task": "<b>Task:</b> {task}",
+        "brief_state_change": "<b>State change:</b> New status is {status}",
+        "brief_state_not_needed": "<b>State change:</b> Not needed",
+        "brief_comment": "<b>Comment to add:</b> {comment}",
+        "brief_link": "<b>Task link:</b> {link}",
+        
+        "apply_button": "✅ Apply changes to Jira ({count})",
+        "applying_changes": "Applying changes to Jira...",
+        "change_set_expired": "❌ These changes are no longer available. Run /brief again.",
+        "change_set_not_owner": "❌ Only the user who requested the brief can apply these changes.",
+        "changes_applied": "✅ Changes applied.\nStatus changes: {transitioned}\nComments: {commented}",
+        "changes_failed": "❌ Failed to apply:\n{failed}",
+        "stats_not_allowed": "❌ The /stats command is only available to bot admins.",
     }
 }
 
@@ -0,0 +1,190 @@
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from langchain_core.messages import AIMessage
+
+from LLM import trace_recorder
+from LLM.llm_handler import handle_llm_command
+from LLM.model_router import get_model_config, set_chat_model_factory
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+REPLAY_CREDENTIALS = {
+    'jira_token': 'replay',
+    'jira_username': 'replay',
+    'jira_url': 'https://replay.atlassian.net',
+    'jira_cloud_id': 'replay'
+}
+EMPTY_BRIEF = '{"agreements": []}'
+EMPTY_ISSUES = {'issues': [], 'total': 0}
+
+_current_session: ContextVar[Optional["ReplaySession"]] = ContextVar("replay_session", default=None)
+
+
+class ReplaySession:
+
+    def __init__(self, trace: Dict, speedup: float):
+        self.trace = trace
+        self.speedup = speedup
+        self.diverged = False
+        self._llm_calls: Dict[str, deque] = defaultdict(deque)
+        for call in trace['llm_calls']:
+            self._llm_calls[call['model']].append(call)
+        self._tool_calls: Dict[str, deque] = defaultdict(deque)
+        for call in trace['tool_calls']:
+            self._tool_calls[self._tool_key(call['name'], call['args'])].append(call)
+
+    @staticmethod
+    def _tool_key(name: str, args: Dict) -> str:
+        return f"{name}:{json.dumps(args, sort_keys=True)}"
+
+    async def wait(self, elapsed: float) -> None:
+        await asyncio.sleep(elapsed / self.speedup)
+
+    def next_llm_call(self, model: str) -> Optional[Dict]:
+        if calls := self._llm_calls.get(model):
+            return calls.popleft()
+        self.diverged = True
+        logger.warning(f"Trace {self.trace['trace_id']}: no recorded call left for model {model}")
+        return None
+
+    def next_tool_call(self, name: str, args: Dict) -> Optional[Dict]:
+        if calls := self._tool_calls.get(self._tool_key(name, args)):
+            return calls.popleft()
+        self.diverged = True
+        logger.warning(f"Trace {self.trace['trace_id']}: no recorded result for tool {name} {args}")
+        return None
+
+    def tools(self) -> List["ReplayTool"]:
+        return [ReplayTool(name) for name in self.trace.get('tools') or []]
+
+
+class ReplayChatModel:
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def bind(self, **kwargs) -> "ReplayChatModel":
+        return self
+
+    def bind_tools(self, tools, **kwargs) -> "ReplayChatModel":
+        return self
+
+    async def ainvoke(self, messages) -> AIMessage:
+        session = _current_session.get()
+        if not (call := session.next_llm_call(self.model_name)):
+            return AIMessage(content=EMPTY_BRIEF)
+        await session.wait(call['elapsed'])
+        return AIMessage(content=call['content'], tool_calls=call['tool_calls'])
+
+
+class ReplayTool:
+
+    def __init__(self, name: str):
+        self.name = name
+
+    async def ainvoke(self, args: Dict) -> str:
+        session = _current_session.get()
+        if not (call := session.next_tool_call(self.name, args)):
+            return f"Error running {self.name}: no recorded result"
+        await session.wait(call['elapsed'])
+        return call['result'] if call['result'] is not None else f"<redacted {call.get('result_chars', 0)} chars>"
+
+
+def create_replay_model(model_id: str, max_tokens: int) -> ReplayChatModel:
+    return ReplayChatModel(get_model_config(model_id)['model'])
+
+
+def load_traces(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        traces = [json.loads(line) for line in f if line.strip()]
+    return sorted(traces, key=lambda trace: trace['started_at'])
+
+
+def get_transcript(trace: Dict) -> str:
+    if trace.get('transcript'):
+        return trace['transcript']
+    return "\n".join(f"user: {'x' * 60}" for _ in range(max(trace['transcript_chars'] // 68, 1)))
+
+
+async def replay_trace(trace: Dict, offset: float, speedup: float) -> Dict:
+    await asyncio.sleep(offset / speedup)
+
+    session = ReplaySession(trace, speedup)
+    _current_session.set(session)
+    started_at = time.monotonic()
+    response, success = await handle_llm_command(
+        get_transcript(trace),
+        trace['llm_choice'],
+        credentials=REPLAY_CREDENTIALS,
+        tools=session.tools(),
+        issues=trace.get('issues') or EMPTY_ISSUES
+    )
+    return {
+        'trace_id': trace['trace_id'],
+        'recorded_duration': trace['duration'],
+        'replayed_duration': round((time.monotonic() - started_at) * speedup, 4),
+        'recorded_success': trace['success'],
+        'success': success,
+        'agreements': len(response['agreements']) if success else None,
+        'diverged': session.diverged
+    }
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)] if values else 0.0
+
+
+async def replay(path: str, speedup: float, output: Optional[str]) -> None:
+    traces = load_traces(path)
+    if not traces:
+        logger.warning(f"No traces found in {path}")
+        return
+
+    trace_recorder.BRIEF_TRACE_FILE = ""
+    set_chat_model_factory(create_replay_model)
+    first_started_at = traces[0]['started_at']
+    logger.info(f"Replaying {len(traces)} traces from {path} at {speedup}x")
+
+    results = await asyncio.gather(
+        *(replay_trace(trace, trace['started_at'] - first_started_at, speedup) for trace in traces)
+    )
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    recorded = [result['recorded_duration'] for result in results]
+    replayed = [result['replayed_duration'] for result in results]
+    logger.info(
+        f"Replayed {len(results)} briefs: "
+        f"{sum(result['success'] for result in results)} succeeded "
+        f"({sum(result['recorded_success'] for result in results)} recorded), "
+        f"{sum(result['diverged'] for result in results)} diverged from the recording"
+    )
+    logger.info(
+        f"Latency p50/p95 recorded {statistics.median(recorded):.2f}s/{percentile(recorded, 0.95):.2f}s, "
+        f"replayed {statistics.median(replayed):.2f}s/{percentile(replayed, 0.95):.2f}s (scaled to real time)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay captured brief traces against local stand-ins")
+    parser.add_argument("traces", help="JSONL file written with BRIEF_TRACE_FILE")
+    parser.add_argument("--speedup", type=float, default=1.0, help="Replay speed-up factor (default: 1.0)")
+    parser.add_argument("--output", help="Write per-brief replay results to this JSONL file")
+    args = parser.parse_args()
+
+    asyncio.run(replay(args.traces, args.speedup, args.output))